@@ -0,0 +1,234 @@
+"""
+Headless batch generation of search links for many profiles.
+
+A profile is a search (city, station type, mode, minutes) plus the house filters of the
+links. Profiles sharing the same search reuse its area: every distinct area is computed once,
+in a pool of processes, and as soon as it is ready the links of all its profiles are written
+as JSON lines.
+
+    python batch.py profiles.csv -o links.jsonl --workers 4
+    python batch.py profiles.jsonl            # results on stdout
+
+Columns / keys of a profile: city, station_type (several types joined by '+', e.g.
+"subway+tram"), mode, minutes, backend (default "ors"), optional id, and the house filters priceMin, priceMax, areaMin, areaMax, roomsMin, roomsMax,
+n_bagni, typology, fascia_piano, asta (defaults as in the app).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import shapely
+
+import http_client
+import utils
+from isochrone_cache import IsochroneCache
+from isochrone_engine import IsochroneEngine, ORS_REQUESTS_PER_MINUTE, snap_to_ladder
+from pipeline import build_links, build_search_area, simplify_search_area
+from station_store import load_stations
+from utils import normalize_poi_types
+
+
+SEARCH_FIELDS = ("city", "station_type", "mode", "minutes", "backend")
+DEFAULT_FILTERS = {
+    "priceMin": 250000,
+    "priceMax": 350000,
+    "areaMin": 60,
+    "areaMax": 80,
+    "roomsMin": 2,
+    "roomsMax": 3,
+    "n_bagni": 1,
+    "typology": "4",
+    "fascia_piano": "10",
+    "asta": 1,
+}
+INT_FIELDS = {"minutes", "priceMin", "priceMax", "areaMin", "areaMax", "roomsMin", "roomsMax", "n_bagni", "asta"}
+
+
+def read_profiles(path):
+    """
+    Read the profiles of a CSV or JSONL file ("-" reads JSONL from stdin).
+
+    Returns:
+        list of dict: One profile per row, see `normalize_profiles`.
+    """
+    if path == "-":
+        rows = [json.loads(line) for line in sys.stdin if line.strip()]
+    elif path.endswith(".csv"):
+        with open(path, newline="") as file:
+            rows = [{key: value for key, value in row.items() if value not in (None, "")} for row in csv.DictReader(file)]
+    else:
+        with open(path) as file:
+            rows = [json.loads(line) for line in file if line.strip()]
+    return normalize_profiles(rows)
+
+
+def normalize_profiles(rows):
+    """
+    Fill in the default backend and filters, convert the numeric fields to int and the station
+    types to a tuple.
+    """
+    profiles = []
+    for row in rows:
+        missing = [field for field in SEARCH_FIELDS[:4] if field not in row]
+        if missing:
+            raise ValueError(f"read_profiles, campi mancanti nel profilo {row}: {missing}")
+        profile = {"backend": "ors", **DEFAULT_FILTERS, **row}
+        for field in INT_FIELDS:
+            profile[field] = int(profile[field])
+        for field in ("typology", "fascia_piano"):
+            profile[field] = str(profile[field])
+        profile["station_type"] = normalize_poi_types(profile["station_type"])
+        profiles.append(profile)
+    return profiles
+
+
+def search_key(profile, snap=False):
+    """The geometric part of a profile: profiles with the same key share their search area."""
+    minutes = snap_to_ladder(profile["minutes"]) if snap and profile["backend"] == "ors" else profile["minutes"]
+    return (profile["city"], profile["station_type"], profile["mode"], minutes, profile["backend"])
+
+
+_engine_options = None
+
+
+def _init_worker(engine_options):
+    """Set the options of the worker's engine, built on the first key using OpenRouteService."""
+    global _engine_options
+    # Connections of the parent's pool must not be shared with the forked workers
+    http_client._client = None
+    utils._isochrone_engine = None
+    _engine_options = dict(engine_options)
+
+
+def _worker_engine():
+    """Give the worker its own engine, with its share of the API quota."""
+    if utils._isochrone_engine is None:
+        options = dict(_engine_options)
+        cache_path = options.pop("cache_path", None)
+        cache = IsochroneCache(cache_path) if cache_path else IsochroneCache()
+        utils._isochrone_engine = IsochroneEngine(cache=cache, client=http_client.get_client(), **options)
+    return utils._isochrone_engine
+
+
+def _compute_area(key):
+    """
+    Simplified search area of a key, as (WKB, vertices, area error). Raises the error of the
+    isochrone requests when there is no area.
+    """
+    if key[4] == "ors":
+        _worker_engine()
+    # The area is memoized, so simplify_search_area reuses it
+    errors = []
+    if build_search_area(*key, on_error=errors.append) is None:
+        raise errors[0] if errors else RuntimeError("Nessuna isocrona calcolata")
+    simplified = simplify_search_area(*key)
+    return shapely.to_wkb(simplified.geometry), simplified.vertices, simplified.area_error
+
+
+def run_batch(profiles, output, workers=None, snap=False, engine_options=None):
+    """
+    Compute the links of every profile and write them to `output` as JSON lines, in the order
+    the areas are ready. Every line holds the profile, its index in `profiles` and either the
+    two links or an error.
+
+    Parameters:
+    - profiles: list of dicts, see `read_profiles`
+    - output: text file object
+    - workers: processes computing the areas (default: number of CPUs; 1 computes them here)
+    - snap: round the minutes to the isochrone ladder, so that more profiles share an area
+    - engine_options: keyword arguments of the workers' `IsochroneEngine`, plus an optional
+      `cache_path`; the requests per minute are split among the workers
+
+    Returns:
+    - dict with the number of profiles, distinct areas, errors and the elapsed seconds
+    """
+    start = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    groups = {}
+    for index, profile in enumerate(profiles):
+        groups.setdefault(search_key(profile, snap), []).append(index)
+
+    # Download the missing station snapshots once, before the workers race for them
+    station_errors = {}
+    for city, station_types in {(key[0], key[1]) for key in groups}:
+        try:
+            load_stations(city, station_types)
+        except Exception as e:
+            station_errors[city, station_types] = e
+
+    engine_options = dict(engine_options or {})
+    requests_per_minute = engine_options.pop("requests_per_minute", ORS_REQUESTS_PER_MINUTE)
+    engine_options["requests_per_minute"] = requests_per_minute / workers if requests_per_minute else None
+    engine_options.setdefault("burst", max(1, 4 // workers))
+
+    errors = 0
+
+    def write(key, result=None, error=None):
+        nonlocal errors
+        geometry = shapely.from_wkb(result[0]) if result else None
+        for index in groups[key]:
+            profile = profiles[index]
+            line = {"index": index, **profile}
+            if error is not None:
+                line["error"] = str(error)
+                errors += 1
+            else:
+                filters = [profile[name] for name in DEFAULT_FILTERS]
+                line["immobiliare"], line["idealista"] = build_links(geometry, *filters)
+                line["vertices"], line["area_error"] = result[1], round(result[2], 4)
+            output.write(json.dumps(line, ensure_ascii=False) + "\n")
+        output.flush()
+
+    areas = len(groups)
+    for key in [key for key in groups if (key[0], key[1]) in station_errors]:
+        write(key, error=station_errors[key[0], key[1]])
+        del groups[key]
+
+    if workers == 1:
+        _init_worker(engine_options)
+        for key in groups:
+            try:
+                write(key, _compute_area(key))
+            except Exception as e:
+                write(key, error=e)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(engine_options,)) as pool:
+            futures = {pool.submit(_compute_area, key): key for key in groups}
+            for future in as_completed(futures):
+                try:
+                    write(futures[future], future.result())
+                except Exception as e:
+                    write(futures[future], error=e)
+
+    return {
+        "profiles": len(profiles),
+        "areas": areas,
+        "errors": errors,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the search links of many profiles.")
+    parser.add_argument("profiles", help="CSV or JSONL file of profiles, '-' for JSONL on stdin")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("--workers", type=int, default=None, help="processes computing the areas (default: CPUs)")
+    parser.add_argument("--snap", action="store_true", help="round the minutes to the isochrone ladder")
+    args = parser.parse_args()
+
+    profiles = read_profiles(args.profiles)
+    if args.output:
+        with open(args.output, "w") as output:
+            stats = run_batch(profiles, output, args.workers, args.snap)
+    else:
+        stats = run_batch(profiles, sys.stdout, args.workers, args.snap)
+    print(f"{stats['profiles']} profiles, {stats['areas']} areas, {stats['errors']} errors "
+          f"in {stats['seconds']:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
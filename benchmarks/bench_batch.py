@@ -0,0 +1,74 @@
+"""
+Throughput of the batch CLI against a local ORS stub, with 1 worker and with one per CPU.
+
+    python -m benchmarks.bench_batch
+
+Profiles combine AREAS distinct searches with FILTER_VARIANTS house filters each, so only
+one profile in FILTER_VARIANTS computes geometry. Stations are a synthetic snapshot of
+Milano, written with the isochrone caches to a temporary directory.
+"""
+import io
+import itertools
+import os
+import tempfile
+
+import batch
+import station_store
+from pipeline import build_search_area, find_stations, search_stations, simplify_search_area
+from boundaries import get_city_boundary
+from benchmarks.bench_clean_poi import random_pois
+from benchmarks.stubs import StubORSServer
+
+MODES = ("foot-walking", "cycling-regular", "driving-car")
+MINUTES = (5, 10, 15, 20)
+FILTER_VARIANTS = 5
+
+
+def make_profiles(n_areas):
+    searches = list(itertools.product(MODES, MINUTES))[:n_areas]
+    return [
+        {"city": "Milano", "station_type": "subway", "mode": mode, "minutes": minutes,
+         "priceMax": 300000 + 25000 * variant, "id": f"{mode}-{minutes}-{variant}"}
+        for mode, minutes in searches
+        for variant in range(FILTER_VARIANTS)
+    ]
+
+
+def run(areas=(4, 12), latency=0.05):
+    results = []
+    snapshot_dir = station_store.SNAPSHOT_DIR
+    # Stations and isochrones live in a temporary directory, away from the real snapshots
+    with tempfile.TemporaryDirectory() as tmp, StubORSServer(latency=latency) as stub:
+        station_store.SNAPSHOT_DIR = os.path.join(tmp, "stations")
+        try:
+            station_store.save_snapshot("Milano", "subway", random_pois(300, get_city_boundary("Milano").bounds))
+            find_stations.cache_clear()
+            search_stations.cache_clear()
+            for n_areas in areas:
+                profiles = batch.normalize_profiles(make_profiles(n_areas))
+                for workers in sorted({1, os.cpu_count() or 1}):
+                    simplify_search_area.cache_clear()
+                    build_search_area.cache_clear()
+                    output = io.StringIO()
+                    stats = batch.run_batch(profiles, output, workers=workers, engine_options={
+                        "base_url": stub.isochrones_url,
+                        "requests_per_minute": None,
+                        "cache_path": os.path.join(tmp, f"isochrones_{n_areas}_{workers}.sqlite"),
+                    })
+                    assert stats["errors"] == 0 and output.getvalue().count("\n") == len(profiles)
+                    results.append({
+                        "benchmark": "batch",
+                        "configuration": f"{n_areas} areas, {workers} workers",
+                        "profiles": len(profiles),
+                        "batch_s": stats["seconds"],
+                        "profiles_per_s": round(len(profiles) / stats["seconds"], 1),
+                    })
+        finally:
+            station_store.SNAPSHOT_DIR = snapshot_dir
+            find_stations.cache_clear()
+            search_stations.cache_clear()
+    return results
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
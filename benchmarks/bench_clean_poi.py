@@ -0,0 +1,62 @@
+"""
+Point-in-boundary filtering of the stations, vectorized vs the old per-point loop.
+
+    python -m benchmarks.bench_clean_poi
+"""
+import time
+
+import numpy as np
+from shapely.geometry import shape
+
+from utils import clean_poi_dataset, get_prepared_boundary, load_city_boundary
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def random_pois(n, bounds, seed=0):
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    lons = rng.uniform(minx, maxx, n)
+    lats = rng.uniform(miny, maxy, n)
+    return [{"lat": lat, "lon": lon, "name": f"Stop {i}", "id": i} for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+def legacy_clean_poi_dataset(poi_coords, boundary):
+    boundary_shape = shape(boundary)
+    return [
+        {"lat": poi["lat"], "lon": poi["lon"], "name": poi["name"]}
+        for poi in poi_coords
+        if boundary_shape.contains(shape({"type": "Point", "coordinates": (poi["lon"], poi["lat"])}))
+    ]
+
+
+def run(sizes=SIZES, city="Milano"):
+    boundary_dict = load_city_boundary(city)
+    boundary = get_prepared_boundary(city)
+    results = []
+    for n in sizes:
+        pois = random_pois(n, boundary.bounds)
+
+        start = time.perf_counter()
+        filtered = clean_poi_dataset(pois, boundary)
+        vectorized_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = legacy_clean_poi_dataset(pois, boundary_dict)
+        legacy_s = time.perf_counter() - start
+        assert len(filtered) == len(expected)
+
+        results.append({
+            "benchmark": "clean_poi_dataset",
+            "points": n,
+            "inside": len(filtered),
+            "vectorized_s": round(vectorized_s, 4),
+            "legacy_s": round(legacy_s, 4),
+            "speedup": round(legacy_s / vectorized_s, 1),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
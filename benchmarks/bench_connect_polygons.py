@@ -0,0 +1,98 @@
+"""
+connect_polygons with the STRtree + Kruskal MST vs the old O(n^3) Prim loop.
+
+    python -m benchmarks.bench_connect_polygons
+
+The old implementation is only timed up to LEGACY_MAX_POLYGONS, above that it takes hours.
+The same islands are also connected with one far-away polygon added, which must not make the
+candidate search quadratic.
+"""
+import time
+
+import numpy as np
+import shapely
+from shapely.geometry import LineString
+from shapely.ops import nearest_points, unary_union
+
+from utils import connect_polygons
+
+SIZES = (50, 500, 5_000)
+LEGACY_MAX_POLYGONS = 50
+
+
+def random_islands(n, seed=0):
+    """Disjoint polygons scattered over a Milano-sized area, like dissolved isochrones."""
+    rng = np.random.default_rng(seed)
+    side = 0.02 * np.sqrt(n)
+    # Some circles overlap and merge, so draw a few more than needed
+    m = int(n * 1.3)
+    centers = shapely.points(9.19 + rng.uniform(-side, side, m), 45.46 + rng.uniform(-side, side, m))
+    circles = shapely.buffer(centers, rng.uniform(0.002, 0.006, m), quad_segs=8)
+    dissolved = shapely.union_all(circles)
+    return list(getattr(dissolved, "geoms", [dissolved]))[:n]
+
+
+def with_outlier(polygons, offset=0.5):
+    """`polygons` plus a small square `offset` degrees away from all of them."""
+    minx, miny, maxx, maxy = shapely.total_bounds(polygons)
+    return polygons + [shapely.box(maxx + offset, maxy + offset, maxx + offset + 0.001, maxy + offset + 0.001)]
+
+
+def legacy_connect_polygons(polygons, bridge_width=1e-6):
+    n = len(polygons)
+    bridges = []
+    connected = {0}
+    available = set(range(1, n))
+    while available:
+        min_edge = None
+        min_dist = float('inf')
+        for i in connected:
+            for j in available:
+                dist = polygons[i].distance(polygons[j])
+                if dist < min_dist:
+                    min_dist = dist
+                    min_edge = (i, j)
+        i, j = min_edge
+        p1, p2 = nearest_points(polygons[i], polygons[j])
+        bridges.append(LineString([p1, p2]).buffer(bridge_width))
+        connected.add(j)
+        available.remove(j)
+    return unary_union(polygons + bridges)
+
+
+def run(sizes=SIZES):
+    results = []
+    for n in sizes:
+        polygons = random_islands(n)
+
+        start = time.perf_counter()
+        connected = connect_polygons(polygons, disjoint=True)
+        mst_s = time.perf_counter() - start
+
+        row = {
+            "benchmark": "connect_polygons",
+            "polygons": len(polygons),
+            "mst_s": round(mst_s, 4),
+            "parts": len(getattr(connected, "geoms", [connected])),
+        }
+        if len(polygons) <= LEGACY_MAX_POLYGONS:
+            start = time.perf_counter()
+            expected = legacy_connect_polygons(polygons)
+            row["legacy_s"] = round(time.perf_counter() - start, 4)
+            row["area_difference"] = connected.symmetric_difference(expected).area
+        results.append(row)
+
+        start = time.perf_counter()
+        connected = connect_polygons(with_outlier(polygons), disjoint=True)
+        results.append({
+            "benchmark": "connect_polygons_outlier",
+            "polygons": len(polygons) + 1,
+            "mst_s": round(time.perf_counter() - start, 4),
+            "parts": len(getattr(connected, "geoms", [connected])),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
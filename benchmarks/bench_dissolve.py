@@ -0,0 +1,54 @@
+"""
+Dissolve of the station isochrones: streaming IncrementalDissolver vs a single GeoSeries union.
+
+    python -m benchmarks.bench_dissolve
+
+`first_partial_s` is how long the streaming dissolver takes to produce a displayable
+geometry after the first batch of 5 isochrones.
+"""
+import time
+
+import geopandas as gpd
+from shapely.geometry import shape
+
+from utils import IncrementalDissolver
+from benchmarks.fixtures import scaled_isochrones
+
+SIZES = (100, 1_000, 5_000)
+BATCH = 5
+
+
+def run(sizes=SIZES):
+    results = []
+    for n in sizes:
+        isochrones = scaled_isochrones(n)
+
+        start = time.perf_counter()
+        expected = gpd.GeoSeries([shape(geometry) for geometry in isochrones]).union_all()
+        geoseries_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dissolver = IncrementalDissolver()
+        first_partial_s = None
+        for i in range(0, n, BATCH):
+            dissolver.add(isochrones[i:i + BATCH])
+            if first_partial_s is None:
+                dissolver.geometry
+                first_partial_s = time.perf_counter() - start
+        dissolved = dissolver.geometry
+        incremental_s = time.perf_counter() - start
+
+        results.append({
+            "benchmark": "dissolve_isochrone",
+            "isochrones": n,
+            "geoseries_s": round(geoseries_s, 4),
+            "incremental_s": round(incremental_s, 4),
+            "first_partial_s": round(first_partial_s, 4),
+            "area_difference": dissolved.symmetric_difference(expected).area,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
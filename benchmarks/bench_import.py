@@ -0,0 +1,62 @@
+"""
+Cold import time of the core modules, each in a fresh interpreter, against IMPORT_BUDGET_S.
+
+    python -m benchmarks.bench_import
+
+The core must not pull in the UI stack: importing it with streamlit, pydeck, geopandas or
+matplotlib loaded fails the benchmark.
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+MODULES = ("pipeline", "utils", "link_generator", "polyline_encoder")
+UI_MODULES = ("streamlit", "pydeck", "geopandas", "matplotlib")
+IMPORT_BUDGET_S = 1.0
+REPEAT = 5
+
+SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "ui": [name for name in {ui!r} if name in sys.modules]}}))
+"""
+
+
+def import_time(module):
+    """(seconds, UI modules loaded) of `import module` in a new interpreter."""
+    output = subprocess.run(
+        [sys.executable, "-c", SCRIPT.format(module=module, ui=UI_MODULES)],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return result["seconds"], result["ui"]
+
+
+def run(modules=MODULES, repeat=REPEAT):
+    results = []
+    for module in modules:
+        timings, ui = [], []
+        for _ in range(repeat):
+            seconds, ui = import_time(module)
+            timings.append(seconds)
+        median = statistics.median(timings)
+        if ui:
+            raise AssertionError(f"import {module} loads the UI modules {ui}")
+        if median > IMPORT_BUDGET_S:
+            raise AssertionError(f"import {module} takes {median:.2f}s, over the {IMPORT_BUDGET_S}s budget")
+        results.append({
+            "benchmark": "import",
+            "module": module,
+            "median_s": round(median, 3),
+            "min_s": round(min(timings), 3),
+            "budget": IMPORT_BUDGET_S,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,109 @@
+"""
+End-to-end latency of the isochrone fetch against a local ORS stub.
+
+    python -m benchmarks.bench_isochrones
+
+The legacy figure replays the old loop (one station per request, sequential) and adds the
+fixed 3 s sleep it did after every request analytically instead of actually waiting.
+"""
+import os
+import random
+import tempfile
+import time
+
+import requests
+
+from isochrone_engine import IsochroneEngine, ORS_REQUESTS_PER_MINUTE, LADDER_MINUTES
+from isochrone_cache import IsochroneCache
+from benchmarks.stubs import StubORSServer
+
+SIZES = (20, 100, 500)
+LEGACY_SLEEP = 3
+
+
+def random_stations(n, seed=0):
+    rng = random.Random(seed)
+    return [{"lat": 45.46 + rng.uniform(-0.05, 0.05), "lon": 9.19 + rng.uniform(-0.07, 0.07)} for _ in range(n)]
+
+
+def legacy_fetch(url, stations, time_minutes):
+    isochrones = []
+    for poi in stations:
+        payload = {"locations": [[poi["lon"], poi["lat"]]], "range": [time_minutes * 60], "range_type": "time"}
+        response = requests.post(url, json=payload)
+        response.raise_for_status()
+        isochrones.extend(f["geometry"] for f in response.json()["features"])
+    return isochrones
+
+
+def run(sizes=SIZES, latency=0.2, error_rate=0.05):
+    results = []
+    with StubORSServer(latency=latency, error_rate=error_rate) as stub:
+        for n in sizes:
+            stations = random_stations(n)
+
+            start = time.perf_counter()
+            with IsochroneEngine(base_url=stub.isochrones_url, max_workers=8, requests_per_minute=None,
+                                 backoff=0.05) as engine:
+                isochrones = engine.fetch(stations, "foot-walking", 10)
+            engine_s = time.perf_counter() - start
+            assert len(isochrones) == n
+
+            # Lower bound imposed by the real public quota on the same number of requests
+            requests_needed = -(-n // engine.batch_size)
+            quota_s = max(0, requests_needed - 4) * 60 / ORS_REQUESTS_PER_MINUTE
+
+            stub.error_rate = 0
+            start = time.perf_counter()
+            legacy_fetch(stub.isochrones_url + "foot-walking", stations[:20], 10)
+            legacy_s = (time.perf_counter() - start) * n / min(n, 20) + n * LEGACY_SLEEP
+            stub.error_rate = error_rate
+
+            # Cold then warm run through the disk cache, counting what reaches the server
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = IsochroneCache(os.path.join(tmp, "isochrones.sqlite"))
+                cached_timings = []
+                for _ in range(2):
+                    before = stub.requests
+                    start = time.perf_counter()
+                    with IsochroneEngine(base_url=stub.isochrones_url, max_workers=8, requests_per_minute=None,
+                                         backoff=0.05, cache=cache) as engine:
+                        engine.fetch(stations, "foot-walking", 10)
+                    cached_timings.append((time.perf_counter() - start, stub.requests - before))
+                cache.close()
+
+                # Whole ladder in one pass, then every other slider value on it
+                cache = IsochroneCache(os.path.join(tmp, "ladder.sqlite"))
+                with IsochroneEngine(base_url=stub.isochrones_url, max_workers=8, requests_per_minute=None,
+                                     backoff=0.05, cache=cache) as engine:
+                    start = time.perf_counter()
+                    engine.fetch(stations, "foot-walking", 10, ladder=LADDER_MINUTES)
+                    ladder_s = time.perf_counter() - start
+                    before = stub.requests
+                    start = time.perf_counter()
+                    for minutes in LADDER_MINUTES:
+                        engine.fetch(stations, "foot-walking", minutes, ladder=LADDER_MINUTES)
+                    slider_s = (time.perf_counter() - start) / len(LADDER_MINUTES)
+                    slider_requests = stub.requests - before
+                cache.close()
+
+            results.append({
+                "benchmark": "isochrones",
+                "stations": n,
+                "engine_s": round(engine_s, 3),
+                "engine_requests": requests_needed,
+                "engine_at_quota_s": round(max(engine_s, quota_s), 3),
+                "legacy_estimated_s": round(legacy_s, 3),
+                "cache_cold_s": round(cached_timings[0][0], 3),
+                "cache_warm_s": round(cached_timings[1][0], 3),
+                "cache_warm_requests": cached_timings[1][1],
+                "ladder_cold_s": round(ladder_s, 3),
+                "slider_change_s": round(slider_s, 3),
+                "slider_requests": slider_requests,
+            })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,94 @@
+"""
+Serialization of the search area in the portal links: the Immobiliare.it `vrt` parameter,
+direct vs the old GeoJSON round trip, and the Idealista.it `shape` polyline, NumPy codec vs
+the old `polyline` package loop (exterior of Polygons only).
+
+    python -m benchmarks.bench_links
+"""
+import json
+import time
+from urllib.parse import quote
+
+import geopandas as gpd
+import polyline
+
+from boundaries import get_boundary
+from link_generator import create_link_immobiliare
+from polyline_encoder import encode_polyline_from_shape
+from benchmarks.fixtures import synthetic_search_area
+
+FIXTURES = ("Iso_v2", "test_multipoly", "Milano_boundary")
+SYNTHETIC = (50, 500)
+REPEAT = 200
+FILTERS = (250000, 350000, 60, 80, 2, 3, 1, "4", "10", 1)
+
+
+def legacy_serialize(isochrones_gdf):
+    geojson_data = json.loads(isochrones_gdf.to_json())
+    coordinates = []
+    for feature in geojson_data.get('features', []):
+        geometry = feature.get('geometry', {})
+        for polygon in geometry.get('coordinates', []):
+            for ring in polygon:
+                if isinstance(ring[0], list):
+                    for coord in ring:
+                        longitude, latitude = coord
+                        coordinates.append(f"{latitude},{longitude}")
+                elif isinstance(ring, list) and len(ring) == 2:
+                    longitude, latitude = ring
+                    coordinates.append(f"{latitude},{longitude}")
+    return ";".join(coordinates)
+
+
+def legacy_encode_polyline(polygon):
+    encoded = polyline.encode([(lat, lng) for lng, lat in polygon.exterior.coords])
+    return quote(f"(({encoded}))", safe='')
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / REPEAT
+
+
+def run(fixtures=FIXTURES, synthetic=SYNTHETIC):
+    areas = [(name, get_boundary(name).geometry) for name in fixtures]
+    areas += [(f"synthetic_{n}", synthetic_search_area(n)) for n in synthetic]
+
+    results = []
+    for name, geom in areas:
+        gdf = gpd.GeoDataFrame(geometry=[geom], crs="EPSG:4326")
+
+        legacy, legacy_s = timed(legacy_serialize, gdf)
+        link, direct_s = timed(create_link_immobiliare, geom, *FILTERS)
+        vrt = link.split("&vrt=")[1].split("&")[0]
+
+        results.append({
+            "benchmark": "create_link_immobiliare",
+            "fixture": name,
+            "vertices": vrt.count(";") + 1,
+            "legacy_ms": round(legacy_s * 1000, 3),
+            "direct_ms": round(direct_s * 1000, 3),
+            "legacy_chars": len(legacy),
+            "direct_chars": len(vrt),
+        })
+
+        shape_param, numpy_s = timed(encode_polyline_from_shape, geom)
+        row = {
+            "benchmark": "encode_polyline_from_shape",
+            "fixture": name,
+            "numpy_ms": round(numpy_s * 1000, 3),
+            "chars": len(shape_param),
+        }
+        if geom.geom_type == "Polygon":
+            expected, legacy_s = timed(legacy_encode_polyline, geom)
+            assert shape_param == expected
+            row["legacy_ms"] = round(legacy_s * 1000, 3)
+        results.append(row)
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,86 @@
+"""
+Station download and parsing of `overpass_query` against a local Overpass stub, one union
+query for all the station types against one query per type, and the failover from a stalled
+Overpass instance to a mirror.
+
+    python -m benchmarks.bench_overpass
+
+`latency` is the time the stub waits before each answer, in place of the real server.
+"""
+import time
+
+import utils
+from boundaries import get_city_boundary
+from http_client import Endpoint
+from benchmarks.fixtures import random_overpass_elements
+from benchmarks.stubs import StubOverpassServer
+
+SIZES = (1_000, 10_000, 50_000)
+
+
+def timed_query(endpoint, city, poi_types="bus"):
+    """(seconds, stations) of `overpass_query` sent to `endpoint`."""
+    default = utils.OVERPASS
+    utils.OVERPASS = endpoint
+    try:
+        start = time.perf_counter()
+        stations = utils.overpass_query(city, poi_types)
+        return time.perf_counter() - start, stations
+    finally:
+        utils.OVERPASS = default
+
+
+def run(sizes=SIZES, latency=0.2, city="Milano", stall=3.0, read_timeout=1.0):
+    bounds = get_city_boundary(city).bounds
+    results = []
+    for n in sizes:
+        with StubOverpassServer(random_overpass_elements(n, bounds), latency=latency) as stub:
+            query_s, stations = timed_query(Endpoint("overpass", stub.interpreter_url), city)
+        assert len(stations) == n
+
+        results.append({
+            "benchmark": "overpass_query",
+            "elements": n,
+            "stub_latency": latency,
+            "query_s": round(query_s, 4),
+            "parse_s": round(query_s - latency, 4),
+        })
+
+    # One round trip for all the types against one per type; the stub ignores the query, so
+    # every per-type query parses all the elements too
+    elements = random_overpass_elements(sizes[0], bounds, poi_types=utils.POI_TYPES)
+    with StubOverpassServer(elements, latency=latency) as stub:
+        endpoint = Endpoint("overpass", stub.interpreter_url)
+        union_s, stations = timed_query(endpoint, city, utils.POI_TYPES)
+        separate_s = sum(timed_query(endpoint, city, poi_type)[0] for poi_type in utils.POI_TYPES)
+    assert stations["type"].value_counts().min() > 0
+    results.append({
+        "benchmark": "overpass_union",
+        "elements": sizes[0],
+        "stub_latency": latency,
+        "union_s": round(union_s, 4),
+        "separate_s": round(separate_s, 4),
+    })
+
+    # The first instance answers after `stall` seconds, beyond the read timeout
+    elements = random_overpass_elements(sizes[0], bounds)
+    with StubOverpassServer(elements, latency=stall) as stalled, \
+            StubOverpassServer(elements, latency=latency) as mirror:
+        endpoint = Endpoint("overpass", (stalled.interpreter_url, mirror.interpreter_url),
+                            timeout=(1, read_timeout), max_retries=2)
+        failover_s, stations = timed_query(endpoint, city)
+        next_s, _ = timed_query(endpoint, city)
+    assert len(stations) == sizes[0]
+    results.append({
+        "benchmark": "overpass_failover",
+        "elements": sizes[0],
+        "stub_latency": latency,
+        "failover_s": round(failover_s, 4),
+        "next_query_s": round(next_s, 4),
+    })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,59 @@
+"""
+Throughput of the NumPy polyline codec vs the pure-Python `polyline` package.
+
+    python -m benchmarks.bench_polyline
+"""
+import time
+
+import numpy as np
+import polyline
+import shapely
+from shapely.geometry import shape
+
+import polyline_codec
+from benchmarks.stubs import circle_polygon
+
+SIZES = (1_000, 10_000, 100_000)
+
+
+def isochrone_ring(n_vertices, seed=0):
+    """A jagged isochrone-like ring of (lat, lng) coordinates around Milano."""
+    rng = np.random.default_rng(seed)
+    ring = shapely.get_coordinates(shape(circle_polygon(9.19, 45.46, 1200, n_vertices)))
+    ring[:-1] += rng.normal(0, 0.0005, (n_vertices, 2))
+    ring[-1] = ring[0]
+    return ring[:, ::-1]
+
+
+def throughput(function, argument, n_vertices):
+    start = time.perf_counter()
+    result = function(argument)
+    return result, n_vertices / (time.perf_counter() - start)
+
+
+def run(sizes=SIZES):
+    results = []
+    for n in sizes:
+        coords = isochrone_ring(n)
+        tuples = [tuple(coord) for coord in coords]
+
+        encoded, numpy_encode = throughput(polyline_codec.encode, coords, n)
+        expected, python_encode = throughput(polyline.encode, tuples, n)
+        assert encoded == expected
+        _, numpy_decode = throughput(polyline_codec.decode, encoded, n)
+        _, python_decode = throughput(polyline.decode, encoded, n)
+
+        results.append({
+            "benchmark": "polyline_codec",
+            "vertices": n,
+            "encode_vertices_per_s": round(numpy_encode),
+            "polyline_encode_vertices_per_s": round(python_encode),
+            "decode_vertices_per_s": round(numpy_decode),
+            "polyline_decode_vertices_per_s": round(python_decode),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,85 @@
+"""
+Map rendering of the search area: browser payload and server time, old layers vs `rendering`.
+
+    python -m benchmarks.bench_render
+
+The old path drew the area with a PolygonLayer, every unsimplified vertex with a
+ScatterplotLayer and a matplotlib figure on every run; `matplotlib_ms` is the cost of that
+figure, now only drawn on request.
+"""
+import io
+import time
+
+import geopandas as gpd
+import matplotlib
+import pandas as pd
+import pydeck as pdk
+import shapely
+
+from boundaries import get_boundary
+from rendering import render_area, view_state
+from benchmarks.fixtures import synthetic_search_area
+
+FIXTURES = ("Iso_v2", "test_multipoly", "Milano_boundary")
+SYNTHETIC = (200, 1_000)
+REPEAT = 5
+
+
+def legacy_deck(geom, view):
+    gdf = gpd.GeoDataFrame(geometry=[geom]).explode(index_parts=False)
+    gdf["coordinates"] = gdf["geometry"].apply(
+        lambda polygon: [list(polygon.exterior.coords)] + [list(ring.coords) for ring in polygon.interiors]
+    )
+    layer_iso = pdk.Layer("PolygonLayer", data=pd.DataFrame(gdf.drop(columns=["geometry"])),
+                          get_polygon="coordinates", get_fill_color=[0, 222, 77, 75])
+    vertices = pd.DataFrame(shapely.get_coordinates(geom.exterior if geom.geom_type == "Polygon" else geom),
+                            columns=["lon", "lat"])
+    layer_vertices = pdk.Layer("ScatterplotLayer", data=vertices, get_position=["lon", "lat"], get_radius=5)
+    return pdk.Deck(layers=[layer_iso, layer_vertices], initial_view_state=view)
+
+
+def matplotlib_figure(geom):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    gpd.GeoDataFrame(geometry=[geom], crs="EPSG:4326").plot(ax=ax, alpha=0.5)
+    ax.set_axis_off()
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        result = function(*args)
+    return result, (time.perf_counter() - start) / REPEAT
+
+
+def run(fixtures=FIXTURES, synthetic=SYNTHETIC):
+    matplotlib.use("Agg")
+    areas = [(name, get_boundary(name).geometry) for name in fixtures]
+    areas += [(f"synthetic_{n}", synthetic_search_area(n)) for n in synthetic]
+
+    results = []
+    for name, geom in areas:
+        view = view_state(geom.bounds)
+        legacy_json, legacy_s = timed(lambda: legacy_deck(geom, view).to_json())
+        rendered, rendered_s = timed(render_area, geom)
+        _, matplotlib_s = timed(matplotlib_figure, geom)
+        results.append({
+            "benchmark": "render",
+            "fixture": name,
+            "vertices": int(shapely.get_num_coordinates(geom)),
+            "rendered_vertices": rendered.vertices,
+            "legacy_kb": round(len(legacy_json.encode()) / 1024, 1),
+            "rendered_kb": round(rendered.payload_bytes / 1024, 1),
+            "legacy_ms": round(legacy_s * 1000, 2),
+            "rendered_ms": round(rendered_s * 1000, 2),
+            "matplotlib_ms": round(matplotlib_s * 1000, 2),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,51 @@
+"""
+Simplification of the search area to the link budget: bisection vs the old fixed tolerance.
+
+    python -m benchmarks.bench_simplify
+
+The old code always simplified with a tolerance of 0.001, whatever the size of the area, so
+it could overshoot the link length or throw away detail that would have fit.
+"""
+import time
+
+from link_generator import MAX_AREA_LENGTH
+from pipeline import link_area_length
+from simplification import simplify_to_budget
+from utils import count_vertices
+from benchmarks.fixtures import synthetic_search_area
+
+SIZES = (50, 500, 2_000)
+LEGACY_TOLERANCE = 0.001
+
+
+def run(sizes=SIZES):
+    results = []
+    for n in sizes:
+        area = synthetic_search_area(n)
+
+        start = time.perf_counter()
+        simplified = simplify_to_budget(area, max_length=MAX_AREA_LENGTH, measure=link_area_length)
+        budget_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        legacy = area.simplify(LEGACY_TOLERANCE, preserve_topology=True)
+        legacy_s = time.perf_counter() - start
+
+        results.append({
+            "benchmark": "simplify_to_budget",
+            "isochrones": n,
+            "vertices": simplified.original_vertices,
+            "budget_s": round(budget_s, 4),
+            "budget_vertices": simplified.vertices,
+            "budget_length": link_area_length(simplified.geometry),
+            "budget_area_error": round(simplified.area_error, 4),
+            "legacy_s": round(legacy_s, 4),
+            "legacy_vertices": count_vertices(legacy),
+            "legacy_length": link_area_length(legacy),
+        })
+    return results
+
+
+if __name__ == "__main__":
+    for row in run():
+        print(row)
@@ -0,0 +1,78 @@
+"""
+Synthetic inputs for the benchmarks, reproducible from a seed.
+
+Isochrones are copies of the real search area in `data/Iso_v2.geojson`, shrunk to the size
+of an isochrone, rotated and scattered around Milano, so they keep the irregular outline of
+real ORS output instead of being perfect circles.
+"""
+import functools
+
+import numpy as np
+import shapely
+
+from boundaries import get_boundary
+from utils import POI_FILTERS, IncrementalDissolver, connect_polygons
+
+CENTER = (9.19, 45.46)
+METERS_PER_DEGREE_LAT = 110540
+
+
+@functools.lru_cache(maxsize=None)
+def isochrone_template():
+    """Exterior ring of Iso_v2 centered on the origin, in meters, with a mean radius of 1."""
+    geom = get_boundary("Iso_v2").geometry
+    ring = shapely.get_coordinates(geom.exterior)
+    lon0, lat0 = geom.centroid.x, geom.centroid.y
+    xy = (ring - [lon0, lat0]) * [111320 * np.cos(np.radians(lat0)), METERS_PER_DEGREE_LAT]
+    return xy / np.hypot(xy[:, 0], xy[:, 1]).mean()
+
+
+def scaled_isochrones(n, radius_m=800, spread_m=None, seed=0, center=CENTER):
+    """
+    `n` isochrone-like GeoJSON Polygons shaped like Iso_v2.
+
+    Parameters:
+    - radius_m: mean radius of an isochrone, each one varies by +-30%
+    - spread_m: half side of the square the centers are drawn in; by default it grows with
+      sqrt(n), so that the overlap between isochrones stays about the same at every size
+    - seed: seed of the random generator
+    - center: (lon, lat) of the square
+    """
+    rng = np.random.default_rng(seed)
+    template = isochrone_template()
+    spread_m = spread_m if spread_m is not None else 450 * np.sqrt(n)
+    lon0, lat0 = center
+    scale = np.array([111320 * np.cos(np.radians(lat0)), METERS_PER_DEGREE_LAT])
+
+    isochrones = []
+    for _ in range(n):
+        angle = rng.uniform(0, 2 * np.pi)
+        rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+        ring = template @ rotation.T * radius_m * rng.uniform(0.7, 1.3)
+        ring = (ring + rng.uniform(-spread_m, spread_m, 2)) / scale + [lon0, lat0]
+        ring[-1] = ring[0]
+        isochrones.append({"type": "Polygon", "coordinates": [ring.tolist()]})
+    return isochrones
+
+
+def synthetic_search_area(n, seed=0):
+    """The connected search area of `n` scaled isochrones, as a shapely geometry."""
+    dissolver = IncrementalDissolver()
+    dissolver.add(scaled_isochrones(n, seed=seed))
+    return connect_polygons(dissolver.polygons(), disjoint=True)
+
+
+def random_overpass_elements(n, bounds, seed=0, poi_types=None):
+    """
+    `n` Overpass nodes with a name tag, uniformly drawn within `bounds`. With `poi_types`,
+    they also get the tags of those types in turn (see `utils.POI_FILTERS`).
+    """
+    rng = np.random.default_rng(seed)
+    minx, miny, maxx, maxy = bounds
+    lons, lats = rng.uniform(minx, maxx, n), rng.uniform(miny, maxy, n)
+    type_tags = [tags for poi_type in poi_types or () for tags in POI_FILTERS[poi_type]] or [{}]
+    return [
+        {"type": "node", "id": i, "lat": lat, "lon": lon, "tags": {"name": f"Stop {i}", **type_tags[i % len(type_tags)]}}
+        for i, (lon, lat) in enumerate(zip(lons.tolist(), lats.tolist()))
+    ]
+
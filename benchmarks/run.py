@@ -0,0 +1,167 @@
+"""
+Run the benchmark suite and store the results of the current commit as JSON, or compare two
+result files to spot regressions.
+
+    python -m benchmarks.run                      # every benchmark, full sizes
+    python -m benchmarks.run --quick              # smallest sizes only, for a quick check
+    python -m benchmarks.run --only dissolve links
+    python -m benchmarks.run --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+
+Results are written to `benchmarks/results/<commit>.json` (with a `-dirty` suffix when the
+tree has uncommitted changes). Every benchmark is a `benchmarks.bench_<name>` module whose
+`run()` returns a list of flat dicts, the first two keys of which identify the row.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import traceback
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+BENCHMARKS = (
+    "import", "clean_poi", "overpass", "isochrones", "dissolve", "connect_polygons",
+    "simplify", "links", "polyline", "render", "batch",
+)
+# Arguments of `run()` for --quick
+QUICK = {
+    "import": {"repeat": 2},
+    "clean_poi": {"sizes": (1_000,)},
+    "overpass": {"sizes": (1_000,)},
+    "isochrones": {"sizes": (20,)},
+    "dissolve": {"sizes": (100,)},
+    "connect_polygons": {"sizes": (50,)},
+    "simplify": {"sizes": (50,)},
+    "links": {"synthetic": (50,)},
+    "polyline": {"sizes": (1_000,)},
+    "render": {"synthetic": (200,)},
+    "batch": {"areas": (4,)},
+}
+# Relative change above which a metric is reported as a regression, and smallest absolute
+# change of a timing that counts, below which the difference is noise
+THRESHOLD = 0.2
+MIN_DELTA_S = 0.005
+
+
+def git_commit():
+    """(short commit hash, True if the tree has uncommitted changes), or ("unknown", False)."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+
+def run_benchmarks(names, quick=False):
+    """Run the given benchmarks. A failing benchmark is recorded with its error instead of its rows."""
+    results = {}
+    for name in names:
+        module = importlib.import_module(f"benchmarks.bench_{name}")
+        start = time.perf_counter()
+        try:
+            rows = module.run(**(QUICK.get(name, {}) if quick else {}))
+            results[name] = {"rows": rows, "seconds": round(time.perf_counter() - start, 3)}
+        except Exception:
+            results[name] = {"error": traceback.format_exc()}
+        print(f"{name}: {results[name].get('seconds', 'failed')}", file=sys.stderr)
+    return results
+
+
+def metric_direction(key):
+    """+1 if higher is better, -1 if lower is better, 0 if the value is not a performance metric."""
+    if key.endswith("_per_s"):
+        return 1
+    if key.endswith(("_s", "_ms", "_kb", "_bytes")):
+        return -1
+    return 0
+
+
+def compare(old, new, threshold=THRESHOLD):
+    """
+    Compare the timings of two result files, row by row.
+
+    Returns:
+        list of dict: one entry per metric present in both, with the relative change and
+        whether it is a regression (worse by more than `threshold`).
+    """
+    changes = []
+    for name, new_result in new["benchmarks"].items():
+        old_rows = {
+            tuple(list(row.items())[:2]): row
+            for row in old["benchmarks"].get(name, {}).get("rows", [])
+        }
+        for row in new_result.get("rows", []):
+            old_row = old_rows.get(tuple(list(row.items())[:2]))
+            if old_row is None:
+                continue
+            for key, value in row.items():
+                direction = metric_direction(key)
+                old_value = old_row.get(key)
+                if not direction or not isinstance(value, (int, float)) or not old_value:
+                    continue
+                change = (value - old_value) / old_value
+                delta_s = abs(value - old_value) / (1000 if key.endswith("_ms") else 1)
+                noise = direction < 0 and key.endswith(("_s", "_ms")) and delta_s < MIN_DELTA_S
+                changes.append({
+                    "benchmark": name,
+                    "row": "/".join(str(item) for _, item in list(row.items())[:2]),
+                    "metric": key,
+                    "old": old_value,
+                    "new": value,
+                    "change": round(change, 3),
+                    "regression": -direction * change > threshold and not noise,
+                })
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmarks or compare two result files.")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="run the smallest sizes only")
+    parser.add_argument("--output", help="result file, by default benchmarks/results/<commit>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as file:
+            old = json.load(file)
+        with open(args.compare[1]) as file:
+            new = json.load(file)
+        changes = compare(old, new, args.threshold)
+        for change in changes:
+            flag = "REGRESSION" if change["regression"] else ""
+            print(f"{change['benchmark']:<18} {change['row']:<40} {change['metric']:<28} "
+                  f"{change['old']:>12} -> {change['new']:>12} {change['change']:+.1%} {flag}")
+        sys.exit(1 if any(change["regression"] for change in changes) else 0)
+
+    commit, dirty = git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "quick": args.quick,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "benchmarks": run_benchmarks(args.only, args.quick),
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}{'-quick' if args.quick else ''}.json"
+    )
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(report, file, indent=1)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Local stand-ins for the external services used by the app, for benchmarks and offline runs.
+"""
+import gzip
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def circle_polygon(lon, lat, radius_m, n_vertices=64):
+    """GeoJSON Polygon approximating a circle of `radius_m` meters around (lon, lat)."""
+    dlat = radius_m / 110540
+    dlon = radius_m / (111320 * math.cos(math.radians(lat)))
+    ring = [
+        [lon + dlon * math.cos(2 * math.pi * k / n_vertices), lat + dlat * math.sin(2 * math.pi * k / n_vertices)]
+        for k in range(n_vertices)
+    ]
+    ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+
+class StubServer:
+    """
+    Threaded HTTP server running in the background, usable as a context manager.
+
+    Parameters:
+    - latency: seconds waited before answering each request
+    - error_rate: probability of answering 429 instead of the real response
+    - seed: seed of the random generator driving `error_rate`
+    - retry_after: seconds sent in the Retry-After header of the 429 answers (None omits it)
+    - compress: gzip the answers of clients accepting it, like the real services
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0, retry_after=None, compress=True):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.compress = compress
+        self.requests = 0
+        self.throttled = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, path, body):
+        """Return (status, payload) for a POST request. Implemented by subclasses."""
+        raise NotImplementedError
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stub._lock:
+                    stub.requests += 1
+                    throttle = stub._random.random() < stub.error_rate
+                    if throttle:
+                        stub.throttled += 1
+                time.sleep(stub.latency)
+                if throttle:
+                    status, payload = 429, {"error": "Rate limit exceeded"}
+                else:
+                    status, payload = stub.handle(self.path, body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                if throttle and stub.retry_after is not None:
+                    self.send_header("Retry-After", str(stub.retry_after))
+                if stub.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    data = gzip.compress(data, compresslevel=5)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up waiting, e.g. on a read timeout
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class StubORSServer(StubServer):
+    """
+    OpenRouteService isochrones stub: answers `POST /v2/isochrones/<mode>` with one circular
+    isochrone per (location, range), with a radius proportional to the range.
+    """
+
+    speed_mps = 1.4
+
+    def handle(self, path, body):
+        request = json.loads(body)
+        features = []
+        for group_index, (lon, lat) in enumerate(request["locations"]):
+            for value in request["range"]:
+                features.append({
+                    "type": "Feature",
+                    "properties": {"group_index": group_index, "value": value, "center": [lon, lat]},
+                    "geometry": circle_polygon(lon, lat, value * self.speed_mps),
+                })
+        return 200, {"type": "FeatureCollection", "features": features}
+
+    @property
+    def isochrones_url(self):
+        return self.url + "v2/isochrones/"
+
+
+class StubOverpassServer(StubServer):
+    """
+    Overpass API stub: answers `POST /api/interpreter` with the same `elements` whatever the
+    query, like the JSON output of `out body;`.
+
+    Parameters:
+    - elements: list of Overpass elements returned, e.g. `fixtures.random_overpass_elements`
+    - other parameters as `StubServer`
+    """
+
+    def __init__(self, elements, **kwargs):
+        super().__init__(**kwargs)
+        self.elements = elements
+
+    def handle(self, path, body):
+        return 200, {"version": 0.6, "generator": "StubOverpassServer", "elements": self.elements}
+
+    @property
+    def interpreter_url(self):
+        return self.url + "api/interpreter"
@@ -0,0 +1,103 @@
+"""
+Process-wide registry of the city boundaries.
+
+Each boundary is parsed once per process from `data/<city>_boundary.geojson` (or from its
+precompiled WKB copy under the cache directory) and kept in memory as a prepared shapely
+geometry, together with its bounding box and a simplified version.
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+
+import shapely
+from shapely.geometry import shape
+from shapely.geometry.base import BaseGeometry
+
+from isochrone_cache import CACHE_DIR
+
+
+DATA_DIR = "data"
+COMPILED_DIR = os.path.join(CACHE_DIR, "boundaries")
+SIMPLIFY_TOLERANCE = 0.0005
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class CityBoundary:
+    name: str
+    geometry: BaseGeometry
+    bounds: tuple
+    simplified: BaseGeometry
+
+
+def geojson_path(name):
+    return os.path.join(DATA_DIR, f"{name}.geojson")
+
+
+def compiled_path(name):
+    return os.path.join(COMPILED_DIR, f"{name}.wkb")
+
+
+def read_geojson_geometry(path):
+    """Read a GeoJSON file and return the union of its geometries as a single shapely geometry."""
+    with open(path, "r") as file:
+        data = json.load(file)
+    if data.get("type") == "FeatureCollection":
+        geometries = [shape(feature["geometry"]) for feature in data["features"] if feature.get("geometry")]
+    elif data.get("type") == "Feature":
+        geometries = [shape(data["geometry"])]
+    else:
+        geometries = [shape(data)]
+    return shapely.union_all(geometries)
+
+
+def _read_geometry(name):
+    source = geojson_path(name)
+    compiled = compiled_path(name)
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Boundary file for {name} not found at {source}.")
+
+    if os.path.exists(compiled) and os.path.getmtime(compiled) >= os.path.getmtime(source):
+        with open(compiled, "rb") as file:
+            return shapely.from_wkb(file.read())
+
+    geometry = read_geojson_geometry(source)
+    try:
+        os.makedirs(COMPILED_DIR, exist_ok=True)
+        tmp_path = f"{compiled}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(shapely.to_wkb(geometry))
+        os.replace(tmp_path, compiled)
+    except OSError:
+        # The precompiled copy is only an optimization, e.g. on a read-only filesystem
+        pass
+    return geometry
+
+
+def get_boundary(name):
+    """
+    Return the `CityBoundary` of a GeoJSON file in the data directory, loading it on first use.
+
+    Args:
+        name (str): File name without extension, e.g. 'Milano_boundary'.
+    """
+    boundary = _registry.get(name)
+    if boundary is not None:
+        return boundary
+
+    with _registry_lock:
+        if name not in _registry:
+            geometry = _read_geometry(name)
+            shapely.prepare(geometry)
+            simplified = geometry.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True)
+            shapely.prepare(simplified)
+            _registry[name] = CityBoundary(name, geometry, geometry.bounds, simplified)
+        return _registry[name]
+
+
+def get_city_boundary(city_name):
+    """Return the `CityBoundary` of a city, e.g. `get_city_boundary("Milano")`."""
+    return get_boundary(f"{city_name}_boundary")
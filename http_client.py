@@ -0,0 +1,214 @@
+"""
+Shared HTTP client of the external services (OpenRouteService, Overpass).
+
+Every call goes through one pooled `requests.Session`, so connections are kept alive across
+searches. Each service is an `Endpoint` with its own timeouts, concurrency limit, request
+quota, retry policy and list of mirrors: a mirror that times out or answers 429/5xx is left
+for the next one, which is then used by the following calls too.
+
+    client = get_client()
+    data = client.post(endpoint, "foot-walking", json=payload)
+    data = await client.apost(endpoint, "foot-walking", json=payload)
+
+`requests` is blocking, so `apost` is not native asyncio I/O: it runs `post` in a thread of the
+event loop's default executor, which keeps the loop free while the request is in flight.
+"""
+import asyncio
+import functools
+import random
+import threading
+import time
+
+import requests
+
+from instrumentation import metrics
+
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+CONNECT_TIMEOUT = 5
+USER_AGENT = "homie-app (https://github.com/GetAnHub/homie-app)"
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket used to stay within the API quota.
+
+    Parameters:
+    - rate: tokens added per second
+    - capacity: maximum number of tokens that can be spent in a burst
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class Endpoint:
+    """
+    An external service and the policy of the calls made to it.
+
+    Parameters:
+    - service: name of the service, used as the `service` label of the metrics
+    - urls: base URLs of the service, the first one preferred and the others its mirrors
+    - timeout: timeout of a request in seconds, or a (connect, read) tuple
+    - max_concurrency: requests in flight at the same time, the others wait
+    - requests_per_minute: request quota enforced by a token bucket (None disables it)
+    - burst: number of requests that can be sent back to back before throttling
+    - max_retries: retries of a request answered with 429/5xx or a connection error
+    - backoff: base delay in seconds of the exponential backoff, with jitter
+    - max_delay: longest wait in seconds before a retry, also when Retry-After asks for more
+    - headers: headers sent with every request, e.g. an API key
+    """
+
+    def __init__(self, service, urls, timeout=(CONNECT_TIMEOUT, 30), max_concurrency=4,
+                 requests_per_minute=None, burst=4, max_retries=4, backoff=1.0, max_delay=60.0,
+                 headers=None):
+        if isinstance(urls, str):
+            urls = (urls,)
+        if not urls:
+            raise ValueError(f"Endpoint {service}: nessun URL configurato")
+        self.service = service
+        self.urls = tuple(urls)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_delay = max_delay
+        self.headers = dict(headers or {})
+        self.limiter = TokenBucket(requests_per_minute / 60, burst) if requests_per_minute else None
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._mirror = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        """The base URL currently in use."""
+        return self.urls[self._mirror]
+
+    def failover(self, mirror):
+        """Move the following requests from `mirror` to the next one. Returns the new mirror."""
+        with self._lock:
+            if self._mirror == mirror:
+                self._mirror = (mirror + 1) % len(self.urls)
+            return self._mirror
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt`, honouring a Retry-After header up to `max_delay`."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_delay)
+            except ValueError:
+                pass
+        return min(self.backoff * 2 ** attempt * (1 + random.random()) / 2, self.max_delay)
+
+
+class HttpClient:
+    """
+    Pooled HTTP client shared by all the endpoints. Responses are requested gzip-compressed.
+
+    Parameters:
+    - pool_maxsize: connections kept alive per host
+    """
+
+    def __init__(self, pool_maxsize=16):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=8, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": USER_AGENT,
+        })
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def post(self, endpoint, path="", **kwargs):
+        """
+        POST to `path` under the endpoint's URL and return the decoded JSON answer.
+
+        Keyword arguments are passed to `requests.Session.post` (e.g. `json` or `data`).
+        Connection errors, timeouts and 429/5xx answers are retried on the next mirror right
+        away, and with exponential backoff once every mirror was tried; the last error is raised.
+        A concurrency slot is held only while a request is in flight, not while backing off.
+        """
+        kwargs.setdefault("timeout", endpoint.timeout)
+        headers = {**endpoint.headers, **kwargs.pop("headers", {})}
+        tried = set()
+        for attempt in range(endpoint.max_retries + 1):
+            if endpoint.limiter:
+                start = time.perf_counter()
+                endpoint.limiter.acquire()
+                metrics.inc("http_wait_seconds_total", time.perf_counter() - start,
+                            service=endpoint.service, reason="quota")
+            mirror = endpoint._mirror
+            tried.add(mirror)
+            try:
+                with endpoint._slots:
+                    response = self.session.post(endpoint.urls[mirror] + path, headers=headers, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.inc("http_requests_total", service=endpoint.service, status=type(e).__name__)
+                if attempt == endpoint.max_retries:
+                    raise
+                self._retry(endpoint, attempt, mirror, tried)
+                continue
+            metrics.inc("http_requests_total", service=endpoint.service, status=response.status_code)
+            metrics.inc("http_request_bytes_total", len(response.request.body or b""), service=endpoint.service)
+            metrics.inc("http_response_bytes_total",
+                        int(response.headers.get("Content-Length", len(response.content))),
+                        service=endpoint.service)
+
+            if response.status_code in RETRY_STATUS_CODES and attempt < endpoint.max_retries:
+                self._retry(endpoint, attempt, mirror, tried, response.headers.get("Retry-After"))
+                continue
+            response.raise_for_status()
+            return response.json()
+
+    async def apost(self, endpoint, path="", **kwargs):
+        """Same as `post`, run in a thread of the event loop's default executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(self.post, endpoint, path, **kwargs))
+
+    @staticmethod
+    def _retry(endpoint, attempt, mirror, tried, retry_after=None):
+        following = endpoint.failover(mirror)
+        if following != mirror:
+            metrics.inc("http_failovers_total", service=endpoint.service)
+        if following in tried:
+            seconds = endpoint.delay(attempt, retry_after)
+            metrics.inc("http_wait_seconds_total", seconds, service=endpoint.service, reason="retry")
+            time.sleep(seconds)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide client, sharing its connection pool among all the endpoints."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
@@ -0,0 +1,235 @@
+"""
+Process-wide metrics of the search pipeline.
+
+Every stage of a submit runs inside `stage(name)`, which records its wall and CPU time and
+logs one JSON line on the `homie.metrics` logger. Counters cover the HTTP requests to
+Overpass and OpenRouteService, with their bytes and retry waits, and the cache lookups.
+Gauges record the vertex counts before and after each geometry step. The registry can be
+exported as JSON or as Prometheus text, the latter also over HTTP:
+
+    HOMIE_METRICS_PORT=9108 streamlit run streamlit_app.py
+    curl localhost:9108/metrics
+
+Peak memory is only tracked when tracemalloc runs, which slows every allocation down, e.g.
+with HOMIE_TRACE_MEMORY=1 or `python -X tracemalloc`.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+logger = logging.getLogger("homie.metrics")
+
+METRICS_PREFIX = "homie_"
+
+
+class Metrics:
+    """
+    Thread-safe registry of counters, gauges and summaries, identified by a name and labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {}
+        self.gauges = {}
+        # (name, labels) -> [count, sum, max]
+        self.summaries = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            count, total, maximum = self.summaries.get(key, (0, 0.0, value))
+            self.summaries[key] = (count + 1, total + value, max(maximum, value))
+
+    def vertices(self, step, before, after):
+        """Record the vertex counts of a geometry before and after a processing step."""
+        self.set("geometry_vertices", before, step=step, when="before")
+        self.set("geometry_vertices", after, step=step, when="after")
+
+    @contextmanager
+    def stage(self, name, **fields):
+        """
+        Time a pipeline stage. The yielded dict can be filled with extra fields for the log line.
+
+        CPU time is the one of the calling thread, so work done by thread pools (e.g. the ORS
+        requests) only shows up in the wall time.
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # The peak is global: hand the one reached so far to the enclosing stages first
+            peak = tracemalloc.get_traced_memory()[1]
+            for frame in stack:
+                frame["peak"] = max(frame["peak"], peak)
+            tracemalloc.reset_peak()
+        frame = {"peak": 0}
+        stack.append(frame)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield fields
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+            stack.pop()
+            self.observe("stage_wall_seconds", wall, stage=name)
+            self.observe("stage_cpu_seconds", cpu, stage=name)
+            record = {"stage": name, "wall_s": round(wall, 6), "cpu_s": round(cpu, 6)}
+            if tracing:
+                peak = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+                for parent in stack:
+                    parent["peak"] = max(parent["peak"], peak)
+                self.set("stage_peak_memory_bytes", peak, stage=name)
+                record["peak_memory_bytes"] = peak
+            record.update(fields)
+            logger.info(json.dumps(record, default=str))
+
+    def snapshot(self):
+        """All the metrics as a JSON-serializable dict."""
+        def rows(values):
+            return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in values.items()]
+
+        with self._lock:
+            return {
+                "counters": rows(self.counters),
+                "gauges": rows(self.gauges),
+                "summaries": [
+                    {"name": name, "labels": dict(labels), "count": count, "sum": total, "max": maximum}
+                    for (name, labels), (count, total, maximum) in self.summaries.items()
+                ],
+            }
+
+    def stage_table(self):
+        """One row per stage with its number of calls, total times and slowest call, for display."""
+        with self._lock:
+            summaries = dict(self.summaries)
+            gauges = dict(self.gauges)
+        table = []
+        for (name, labels), (count, total, maximum) in sorted(summaries.items()):
+            if name != "stage_wall_seconds":
+                continue
+            _, cpu_total, _ = summaries.get(("stage_cpu_seconds", labels), (0, 0.0, 0.0))
+            row = {
+                "stage": dict(labels)["stage"],
+                "calls": count,
+                "wall_s": round(total, 3),
+                "cpu_s": round(cpu_total, 3),
+                "max_wall_s": round(maximum, 3),
+            }
+            peak = gauges.get(("stage_peak_memory_bytes", labels))
+            if peak is not None:
+                row["peak_mb"] = round(peak / 2 ** 20, 1)
+            table.append(row)
+        return table
+
+    def hit_rates(self, name="cache_lookups_total"):
+        """Hit rate of every cache counted in `name`, keyed by cache."""
+        lookups = {}
+        with self._lock:
+            for (counter, labels), value in self.counters.items():
+                if counter == name:
+                    labels = dict(labels)
+                    hits, total = lookups.get(labels["cache"], (0, 0))
+                    lookups[labels["cache"]] = (hits + value * (labels["result"] == "hit"), total + value)
+        return {cache: hits / total if total else 0.0 for cache, (hits, total) in lookups.items()}
+
+    def prometheus_text(self):
+        """The metrics in the Prometheus text exposition format."""
+        def series(name, labels, suffix=""):
+            label_text = ",".join(f'{label}="{value}"' for label, value in labels)
+            return f"{METRICS_PREFIX}{name}{suffix}" + (f"{{{label_text}}}" if label_text else "")
+
+        lines = []
+        with self._lock:
+            for kind, values in (("counter", self.counters), ("gauge", self.gauges)):
+                typed = set()
+                for (name, labels), value in sorted(values.items()):
+                    if name not in typed:
+                        lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+                        typed.add(name)
+                    lines.append(f"{series(name, labels)} {value}")
+            # Summaries without quantiles, plus their maximum as a separate gauge
+            maxima = {}
+            typed = set()
+            for (name, labels), (count, total, maximum) in sorted(self.summaries.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {METRICS_PREFIX}{name} summary")
+                    typed.add(name)
+                lines.append(f"{series(name, labels, '_count')} {count}")
+                lines.append(f"{series(name, labels, '_sum')} {total}")
+                maxima.setdefault(name, []).append(f"{series(name, labels, '_max')} {maximum}")
+            for name, max_lines in maxima.items():
+                lines.append(f"# TYPE {METRICS_PREFIX}{name}_max gauge")
+                lines.extend(max_lines)
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.summaries.clear()
+
+
+metrics = Metrics()
+stage = metrics.stage
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def serve_metrics(port, host="0.0.0.0"):
+    """Serve `GET /metrics` (Prometheus text) and `GET /metrics.json` in a background thread."""
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/metrics":
+                    body, content_type = metrics.prometheus_text().encode(), "text/plain; version=0.0.4"
+                elif self.path == "/metrics.json":
+                    body, content_type = json.dumps(metrics.snapshot()).encode(), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+        return _server
+
+
+def configure_from_env():
+    """Start the metrics endpoint and memory tracing if requested by the environment."""
+    if os.environ.get("HOMIE_TRACE_MEMORY") == "1" and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    port = os.environ.get("HOMIE_METRICS_PORT")
+    if port:
+        serve_metrics(int(port))
@@ -0,0 +1,154 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+import shapely
+from shapely.geometry import mapping, shape
+
+from instrumentation import metrics
+
+
+CACHE_DIR = os.environ.get("HOMIE_CACHE_DIR", ".cache")
+DEFAULT_CACHE_PATH = os.path.join(CACHE_DIR, "isochrones.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS isochrones (
+    lon INTEGER NOT NULL,
+    lat INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    range_seconds INTEGER NOT NULL,
+    geometry BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (lon, lat, mode, range_seconds)
+);
+CREATE INDEX IF NOT EXISTS isochrones_accessed_at ON isochrones (accessed_at);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class IsochroneCache:
+    """
+    Persistent isochrone cache backed by SQLite, shared by every session and process using the same file.
+
+    Entries are keyed on (lon, lat, mode, range seconds), with coordinates rounded to `precision`
+    decimals, and store the geometry as zlib-compressed WKB. Entries older than `ttl` seconds are
+    treated as missing, and once the cache holds more than `max_entries` the least recently used
+    ones are evicted.
+
+    Parameters:
+    - path: SQLite database file
+    - ttl: time to live of an entry in seconds (None keeps entries forever)
+    - max_entries: maximum number of stored isochrones
+    - precision: decimals kept when rounding station coordinates
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=30 * 24 * 3600, max_entries=100_000, precision=5):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.precision = precision
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def key(self, lon, lat, mode, range_seconds):
+        scale = 10 ** self.precision
+        return (round(lon * scale), round(lat * scale), mode, int(range_seconds))
+
+    def get_many(self, keys):
+        """
+        Look up several keys at once.
+
+        Returns:
+            dict: key -> GeoJSON geometry, only for the keys found in the cache.
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT geometry, created_at FROM isochrones WHERE lon=? AND lat=? AND mode=? AND range_seconds=?",
+                    key,
+                ).fetchone()
+                if row and (self.ttl is None or now - row[1] <= self.ttl):
+                    found[key] = mapping(shapely.from_wkb(zlib.decompress(row[0])))
+
+            if found:
+                self._conn.executemany(
+                    "UPDATE isochrones SET accessed_at=? WHERE lon=? AND lat=? AND mode=? AND range_seconds=?",
+                    [(now, *key) for key in found],
+                )
+            hits, misses = len(found), len(keys) - len(found)
+            self.hits += hits
+            self.misses += misses
+            metrics.inc("cache_lookups_total", hits, cache="isochrones", result="hit")
+            metrics.inc("cache_lookups_total", misses, cache="isochrones", result="miss")
+            self._conn.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                [("hits", hits), ("misses", misses)],
+            )
+        return found
+
+    def put_many(self, items):
+        """Store (key, GeoJSON geometry) pairs, then evict the least recently used entries over the limit."""
+        now = time.time()
+        rows = [
+            (*key, zlib.compress(shapely.to_wkb(shape(geometry))), now, now)
+            for key, geometry in items
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO isochrones VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                if self.ttl is not None:
+                    self._conn.execute("DELETE FROM isochrones WHERE created_at < ?", (now - self.ttl,))
+                if self.max_entries is not None:
+                    self._conn.execute(
+                        "DELETE FROM isochrones WHERE rowid IN ("
+                        "SELECT rowid FROM isochrones ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def stats(self):
+        """Hit/miss counters of this instance and the totals persisted by every process."""
+        with self._lock:
+            totals = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+            entries = self._conn.execute("SELECT COUNT(*) FROM isochrones").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0),
+            "entries": entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM isochrones")
+            self._conn.execute("DELETE FROM stats")
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM isochrones").fetchone()[0]
@@ -0,0 +1,239 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+from http_client import CONNECT_TIMEOUT, Endpoint, HttpClient
+
+
+ORS_BASE_URL = "https://api.openrouteservice.org/v2/isochrones/"
+ORS_API_KEY_ENV = "ORS_API_KEY"
+
+# Limits of the public OpenRouteService plan for the isochrones endpoint
+ORS_MAX_LOCATIONS = 5
+ORS_REQUESTS_PER_MINUTE = 20
+
+# Travel times fetched together for every station, so that moving the minutes slider
+# between them is served from the cache
+LADDER_MINUTES = (5, 10, 15, 20, 30)
+
+
+def snap_to_ladder(minutes, ladder=LADDER_MINUTES):
+    """The ladder value closest to `minutes`, the larger one on ties."""
+    return min(sorted(ladder), key=lambda value: (abs(value - minutes), -value))
+
+
+class IsochroneEngine:
+    """
+    Concurrent OpenRouteService isochrone client.
+
+    Stations are grouped into batches of up to `batch_size` locations per request and
+    the batches are sent in parallel through an `http_client.HttpClient`, which bounds the
+    request rate with a token bucket and retries 429/5xx responses with exponential backoff.
+    `afetch` is the awaitable variant of `fetch`, for callers running an event loop.
+
+    Parameters:
+    - api_key: OpenRouteService API key (default: the ORS_API_KEY environment variable, required
+      unless `base_url` points to another server, e.g. a local stub)
+    - base_url: isochrones endpoint, the transport mode is appended to it
+    - batch_size: number of locations sent in a single request
+    - max_workers: number of concurrent requests
+    - requests_per_minute: request quota enforced by the token bucket (None disables it)
+    - burst: number of requests that can be sent back to back before throttling
+    - max_retries: retries for a batch answered with 429/5xx or a connection error
+    - backoff: base delay in seconds for the exponential backoff
+    - timeout: read timeout in seconds of a single request
+    - cache: optional `IsochroneCache` consulted before calling the API
+    - client: `HttpClient` sending the requests (default: a new one, closed with the engine)
+    """
+
+    def __init__(self, api_key=None, base_url=ORS_BASE_URL, batch_size=ORS_MAX_LOCATIONS,
+                 max_workers=4, requests_per_minute=ORS_REQUESTS_PER_MINUTE, burst=4,
+                 max_retries=4, backoff=1.0, timeout=30, cache=None, client=None):
+        api_key = api_key or os.environ.get(ORS_API_KEY_ENV)
+        if not api_key and base_url == ORS_BASE_URL:
+            raise RuntimeError(f"Chiave OpenRouteService mancante: imposta la variabile d'ambiente {ORS_API_KEY_ENV}.")
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.cache = cache
+        self.endpoint = Endpoint(
+            "ors", base_url, timeout=(CONNECT_TIMEOUT, timeout), max_concurrency=max_workers,
+            requests_per_minute=requests_per_minute, burst=burst, max_retries=max_retries,
+            backoff=backoff, headers={"Authorization": api_key} if api_key else None,
+        )
+        self._owns_client = client is None
+        self.client = HttpClient(pool_maxsize=max_workers) if client is None else client
+
+    def close(self):
+        if self._owns_client:
+            self.client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fetch(self, poi_coords, mode, time_minutes, ladder=None):
+        """
+        Calculate the isochrones of a list of POIs.
+
+        When the engine has a cache, isochrones already in it are served from disk and only the
+        missing stations are requested to ORS.
+
+        Args:
+            poi_coords (list of dict or DataFrame): POIs with keys 'lat' and 'lon'.
+            mode (str): ORS profile, e.g. 'foot-walking', 'cycling-regular', 'driving-car'.
+            time_minutes (int): Travel time in minutes.
+            ladder (sequence of int): Other travel times, in minutes, requested in the same calls
+                for the missing stations and stored in the cache, e.g. `LADDER_MINUTES`.
+
+        Returns:
+            list of dict: GeoJSON geometries, in the same order as `poi_coords`.
+        """
+        geometries = [None] * len(poi_coords)
+        for chunk in self._iter_chunks(poi_coords, mode, time_minutes, ladder):
+            for index, geometry in chunk:
+                geometries[index] = geometry
+        return [geometry for geometry in geometries if geometry]
+
+    def iter_fetch(self, poi_coords, mode, time_minutes, ladder=None):
+        """
+        Same as `fetch`, but yield the isochrones as soon as they are available: first all
+        the cache hits, then the result of each request as it completes.
+
+        Yields:
+            list of dict: GeoJSON geometries, in no particular order.
+        """
+        for chunk in self._iter_chunks(poi_coords, mode, time_minutes, ladder):
+            if chunk:
+                yield [geometry for _, geometry in chunk]
+
+    async def afetch(self, poi_coords, mode, time_minutes, ladder=None):
+        """
+        Same as `fetch`, awaitable: the batches are sent together with `HttpClient.apost` and
+        awaited with `asyncio.gather`, within the same concurrency limit and request quota.
+
+        Returns:
+            list of dict: GeoJSON geometries, in the same order as `poi_coords`.
+        """
+        range_seconds, ranges, hits, positions, request_locations = self._plan(poi_coords, mode, time_minutes, ladder)
+        geometries = [None] * len(poi_coords)
+        offsets = range(0, len(request_locations), self.batch_size)
+        batches = await asyncio.gather(*(
+            self._afetch_batch(mode, request_locations[offset:offset + self.batch_size], ranges)
+            for offset in offsets
+        ))
+        pending = list(positions)
+        chunks = [hits] + [
+            self._store(mode, range_seconds, positions, pending[offset:offset + len(results)], results)
+            for offset, results in zip(offsets, batches)
+        ]
+        for chunk in chunks:
+            for index, geometry in chunk:
+                geometries[index] = geometry
+        return [geometry for geometry in geometries if geometry]
+
+    def _iter_chunks(self, poi_coords, mode, time_minutes, ladder=None):
+        """Yield lists of (index in poi_coords, GeoJSON geometry) pairs."""
+        range_seconds, ranges, hits, positions, request_locations = self._plan(poi_coords, mode, time_minutes, ladder)
+        yield hits
+
+        pending = list(positions)
+        for offset, results in self._iter_batches(request_locations, mode, ranges):
+            yield self._store(mode, range_seconds, positions, pending[offset:offset + len(results)], results)
+
+    def _plan(self, poi_coords, mode, time_minutes, ladder=None):
+        """
+        Split the POIs into cache hits and locations to request.
+
+        Returns (range in seconds, ranges to request, hits as (index, geometry) pairs, indices
+        in poi_coords of each location to request by key, locations to request).
+        """
+        range_seconds = time_minutes * 60
+        # ORS returns one nested isochrone per range, all in the same response
+        ranges = sorted({range_seconds} | {minutes * 60 for minutes in ladder or ()})
+        if isinstance(poi_coords, pd.DataFrame):
+            locations = list(zip(poi_coords["lon"].tolist(), poi_coords["lat"].tolist()))
+        else:
+            locations = [(poi["lon"], poi["lat"]) for poi in poi_coords]
+
+        # Stations to request, grouped by key: several stations can share a cache key
+        hits = []
+        if self.cache is None:
+            positions = {index: [index] for index in range(len(locations))}
+            request_locations = [list(location) for location in locations]
+        else:
+            keys = [self.cache.key(lon, lat, mode, range_seconds) for lon, lat in locations]
+            cached = self.cache.get_many(keys)
+            positions = {}
+            for index, key in enumerate(keys):
+                if key in cached:
+                    hits.append((index, cached[key]))
+                else:
+                    positions.setdefault(key, []).append(index)
+            # Request the rounded coordinates, so that what is stored matches its key
+            scale = 10 ** self.cache.precision
+            request_locations = [[lon / scale, lat / scale] for lon, lat, _, _ in positions]
+        return range_seconds, ranges, hits, positions, request_locations
+
+    def _store(self, mode, range_seconds, positions, keys, results):
+        """Cache the results of a batch and return its (index in poi_coords, geometry) pairs."""
+        if self.cache is not None:
+            self.cache.put_many([
+                ((lon, lat, mode, value), geometry)
+                for (lon, lat, _, _), by_range in zip(keys, results)
+                for value, geometry in by_range.items()
+            ])
+        return [
+            (index, by_range[range_seconds])
+            for key, by_range in zip(keys, results) if range_seconds in by_range
+            for index in positions[key]
+        ]
+
+    def _iter_batches(self, locations, mode, ranges):
+        """
+        Request the isochrones of `locations` in concurrent batches and yield, as each batch
+        completes, its offset in `locations` and, for every location, a dict mapping each
+        range in seconds to its GeoJSON geometry (missing when ORS returned nothing for it).
+        """
+        offsets = range(0, len(locations), self.batch_size)
+        if not offsets:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(offsets))) as executor:
+            futures = {
+                executor.submit(self._fetch_batch, mode, locations[offset:offset + self.batch_size], ranges): offset
+                for offset in offsets
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def _fetch_batch(self, mode, locations, ranges):
+        data = self.client.post(self.endpoint, mode, json=self._payload(locations, ranges))
+        return self._parse_batch(data, locations, ranges)
+
+    async def _afetch_batch(self, mode, locations, ranges):
+        data = await self.client.apost(self.endpoint, mode, json=self._payload(locations, ranges))
+        return self._parse_batch(data, locations, ranges)
+
+    @staticmethod
+    def _payload(locations, ranges):
+        return {
+            "locations": locations,
+            "range": ranges,
+            "range_type": "time",
+            "attributes": ["area"],
+        }
+
+    @staticmethod
+    def _parse_batch(data, locations, ranges):
+        # ORS returns one feature per (location, range), tagged with the location index and range
+        geometries = [{} for _ in locations]
+        for feature in data.get("features", []):
+            properties = feature.get("properties", {})
+            if feature.get("geometry"):
+                value = int(round(properties.get("value", ranges[-1])))
+                geometries[properties.get("group_index", 0)][value] = feature["geometry"]
+        return geometries
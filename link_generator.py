@@ -1,47 +1,81 @@
-import json
-import streamlit as st
+import logging
+
+import numpy as np
+import shapely
 from polyline_encoder import encode_polyline_from_shape
+from instrumentation import metrics, stage
 from shapely.geometry import Polygon, MultiPolygon
+from shapely.geometry.base import BaseGeometry
+
+# Budget used to simplify the search area, so that the links stay usable in browsers and chats
+MAX_URL_LENGTH = 4000
+# Part of the budget left to the area, the rest is taken by the base URL and the filters
+MAX_AREA_LENGTH = MAX_URL_LENGTH - 600
+
+logger = logging.getLogger(__name__)
+
+def serialize_vertices(geom, precision=5, holes=False):
+    """
+    Serialize the vertices of a search area in Immobiliare.it's `vrt` format: "lat,lon;lat,lon;...".
+
+    Coordinates are read straight from the shapely geometry and formatted in bulk with
+    `precision` decimals (5 decimals is about one meter), without trailing zeros.
+
+    Args:
+        geom (Polygon or MultiPolygon): Search area.
+        precision (int): Decimals kept for every coordinate.
+        holes (bool): Also append the interior rings after each exterior ring. Off by default,
+            since the portal draws a single outline and holes would be joined to it.
+
+    Returns:
+        str: The serialized vertices, polygons one after the other.
+    """
+    if not isinstance(geom, (Polygon, MultiPolygon)):
+        raise TypeError(f"serialize_vertices, unsupported geometry type: {geom.geom_type}")
+
+    parts = shapely.get_parts(geom)
+    rings = shapely.get_rings(parts) if holes else shapely.get_exterior_ring(parts)
+    coords = shapely.get_coordinates(rings)
+    if len(coords) == 0:
+        return ""
+
+    formatted = np.char.mod(f"%.{precision}f", coords)
+    if precision > 0:
+        formatted = np.char.rstrip(np.char.rstrip(formatted, "0"), ".")
+    # The portal wants latitude first
+    pairs = np.char.add(np.char.add(formatted[:, 1], ","), formatted[:, 0])
+    return ";".join(pairs.tolist())
+
 
 def create_link_immobiliare(isochrones_gdf, priceMin, priceMax, areaMin, areaMax, roomsMin, roomsMax, n_bagni, typology, fascia_piano, asta):
     try:
-        geojson_data = json.loads(isochrones_gdf.to_json())
-
-        coordinates = []
-        for feature in geojson_data.get('features', []):  # Handle missing 'features'
-            geometry = feature.get('geometry', {})
-            for polygon in geometry.get('coordinates', []):
-                for ring in polygon:
-                    if isinstance(ring[0], list): # Check if ring is a list of coords
-                        for coord in ring:
-                            if isinstance(coord, list) and len(coord) == 2: # Check if coord is a list of 2 floats
-                                    longitude, latitude = coord
-                                    coordinates.append(f"{latitude},{longitude}")
-                            else:
-                                    print(f"Warning: Invalid coordinate format: {coord}")
-                    elif isinstance(ring, list) and len(ring) == 2: #Handle single coordinate rings
-                        longitude, latitude = ring
-                        coordinates.append(f"{latitude},{longitude}")
-                    else:
-                        print(f"Warning: Invalid ring format: {ring}")
-        
-        coordinates_edit = ";".join(coordinates)
+        # Accept both a shapely geometry and a GeoDataFrame of search areas
+        if isinstance(isochrones_gdf, BaseGeometry):
+            geom = isochrones_gdf
+        else:
+            geom = shapely.union_all(isochrones_gdf.geometry.values)
+
+        with stage("link_immobiliare"):
+            coordinates_edit = serialize_vertices(geom)
         
         api_call_immobiliare = f"https://www.immobiliare.it/search-list/?idContratto=1&idCategoria=1&prezzoMinimo={priceMin}&prezzoMassimo={priceMax}&superficieMinima={areaMin}&superficieMassima={areaMax}&idTipologia%5B0%5D={typology}&localiMinimo={roomsMin}&localiMassimo={roomsMax}&bagni={n_bagni}&tipoProprieta=1&fasciaPiano%5B0%5D=20&fasciaPiano%5B1%5D={fascia_piano}&cantina=1&noAste={asta}&__lang=it&vrt={coordinates_edit}&pag=1"
+        metrics.set("link_length_chars", len(api_call_immobiliare), portal="immobiliare")
         
         return api_call_immobiliare
 
     except Exception as e:
-        st.write(f"create_link_immobiliare, An error occurred: {e}")
+        logger.warning("create_link_immobiliare, An error occurred: %s", e)
         return None
     
 
 def create_link_idealista(isochrones, priceMax, priceMin, areaMin, areaMax, roomsMin, roomsMax, n_bagni):
     try: 
-        polyline = encode_polyline_from_shape(isochrones)
+        with stage("link_idealista"):
+            polyline = encode_polyline_from_shape(isochrones)
         api_call_idealista = f"https://www.idealista.it/aree/vendita-case/con-prezzo_{priceMax},prezzo-min_{priceMin},dimensione_{areaMin},dimensione-max_{areaMax},bilocali-{roomsMin},trilocali-{roomsMax},bagno-{n_bagni},bagno-2,bagno-3,aste_no/lista-mappa?shape={polyline}"
+        metrics.set("link_length_chars", len(api_call_idealista), portal="idealista")
         return api_call_idealista
 
     except Exception as e:
-        st.write(f"create_link_idealista, An error occurred: {e}")
+        logger.warning("create_link_idealista, An error occurred: %s", e)
         return None
\ No newline at end of file
@@ -0,0 +1,303 @@
+"""
+Offline isochrones computed on a local OpenStreetMap street graph, without any routing API.
+
+The street network of a city is read from an OSM XML extract in `data/osm/<city>.osm`
+(optionally .gz or .bz2 compressed), e.g. exported from https://extract.bbbike.org or cut
+with osmium. A single multi-source Dijkstra from all the stations at once labels every
+street node with its closest station; the reachable part of each street is then buffered
+into one polygon per station.
+"""
+import bz2
+import glob
+import gzip
+import heapq
+import os
+import threading
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import mapping
+
+from instrumentation import stage
+from station_selection import MODE_SPEEDS_KMH, project
+
+
+OSM_DIR = os.path.join("data", "osm")
+# Half-width in meters of the area considered reachable around a street
+BUFFER_M = 40
+# Stations farther than this from the street graph are skipped
+MAX_SNAP_M = 500
+
+CAR_HIGHWAYS = {
+    "motorway", "motorway_link", "trunk", "trunk_link", "primary", "primary_link",
+    "secondary", "secondary_link", "tertiary", "tertiary_link", "unclassified",
+    "residential", "living_street", "service", "road",
+}
+NO_ROUTING_HIGHWAYS = {"construction", "proposed", "raceway", "bus_guideway", "platform", "corridor"}
+EXCLUDED_HIGHWAYS = {
+    "foot-walking": NO_ROUTING_HIGHWAYS | {"motorway", "motorway_link", "trunk", "trunk_link"},
+    "cycling-regular": NO_ROUTING_HIGHWAYS | {"motorway", "motorway_link", "trunk", "trunk_link", "steps"},
+    "cycling-electric": NO_ROUTING_HIGHWAYS | {"motorway", "motorway_link", "trunk", "trunk_link", "steps"},
+}
+ACCESS_TAGS = {
+    "foot-walking": "foot",
+    "cycling-regular": "bicycle",
+    "cycling-electric": "bicycle",
+    "driving-car": "motor_vehicle",
+}
+WAY_TAGS = ("highway", "access", "foot", "bicycle", "motor_vehicle", "oneway", "junction")
+
+
+@dataclass(frozen=True)
+class StreetGraph:
+    lons: np.ndarray
+    lats: np.ndarray
+    # Directed edges in CSR form: the edges leaving node i are indptr[i]:indptr[i + 1]
+    indptr: np.ndarray
+    indices: np.ndarray
+    lengths: np.ndarray
+
+
+_osm_cache = {}
+_graph_cache = {}
+_cache_lock = threading.Lock()
+
+
+def find_extract(city):
+    """Path of the OSM extract of a city, or None."""
+    for path in sorted(glob.glob(os.path.join(OSM_DIR, f"{city}.osm*"))):
+        return path
+    return None
+
+
+def _open(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_osm(path):
+    """
+    Read the nodes and the highway ways of an OSM XML file.
+
+    Returns:
+        tuple: (node ids sorted, lons, lats, list of (node refs, tags) of the highway ways)
+    """
+    node_ids, lons, lats, ways = [], [], [], []
+    with _open(path) as file:
+        refs, tags = [], {}
+        # Clear the root too, or it keeps a (cleared) child per element of the whole extract
+        context = ET.iterparse(file, events=("start", "end"))
+        _, root = next(context)
+        for event, element in context:
+            if event == "start":
+                continue
+            if element.tag == "node":
+                node_ids.append(int(element.get("id")))
+                lons.append(float(element.get("lon")))
+                lats.append(float(element.get("lat")))
+            elif element.tag == "nd":
+                refs.append(int(element.get("ref")))
+                continue
+            elif element.tag == "tag":
+                if element.get("k") in WAY_TAGS:
+                    tags[element.get("k")] = element.get("v")
+                continue
+            elif element.tag == "way":
+                if "highway" in tags and len(refs) > 1:
+                    ways.append((refs, tags))
+            elif element.tag != "relation":
+                continue
+            refs, tags = [], {}
+            element.clear()
+            root.clear()
+
+    node_ids = np.array(node_ids, dtype=np.int64)
+    order = np.argsort(node_ids)
+    return node_ids[order], np.array(lons)[order], np.array(lats)[order], ways
+
+
+def _way_direction(tags, mode):
+    """0 if the way cannot be used, 1 forward only, -1 backward only, 2 both directions."""
+    highway = tags["highway"]
+    if mode == "driving-car":
+        if highway not in CAR_HIGHWAYS:
+            return 0
+    elif highway in EXCLUDED_HIGHWAYS.get(mode, NO_ROUTING_HIGHWAYS):
+        return 0
+    access = tags.get(ACCESS_TAGS.get(mode, "access"), tags.get("access"))
+    if access in ("no", "private"):
+        return 0
+
+    if mode == "driving-car":
+        oneway = tags.get("oneway")
+        if oneway in ("yes", "true", "1") or tags.get("junction") == "roundabout":
+            return 1
+        if oneway == "-1":
+            return -1
+    return 2
+
+
+def build_street_graph(osm, mode):
+    """Build the directed street graph of a transport mode from the output of `read_osm`."""
+    node_ids, lons, lats, ways = osm
+    sources, targets = [], []
+    for refs, tags in ways:
+        direction = _way_direction(tags, mode)
+        if direction in (1, 2):
+            sources.extend(refs[:-1])
+            targets.extend(refs[1:])
+        if direction in (-1, 2):
+            sources.extend(refs[1:])
+            targets.extend(refs[:-1])
+
+    def lookup(refs):
+        """Index in node_ids of each ref, -1 for the nodes missing from the extract."""
+        refs = np.array(refs, dtype=np.int64)
+        index = np.searchsorted(node_ids, refs)
+        found = index < len(node_ids)
+        found[found] = node_ids[index[found]] == refs[found]
+        return np.where(found, index, -1)
+
+    # Clipped extracts have ways referencing nodes outside the clip: drop those edges
+    sources, targets = lookup(sources), lookup(targets)
+    kept = (sources >= 0) & (targets >= 0)
+    sources, targets = sources[kept], targets[kept]
+    # Keep only the nodes used by the graph, renumbered from 0
+    used, inverse = np.unique(np.concatenate([sources, targets]), return_inverse=True)
+    sources, targets = inverse[:len(sources)], inverse[len(sources):]
+    lons, lats = lons[used], lats[used]
+
+    x, y = project(lats, lons)
+    lengths = np.hypot(x[targets] - x[sources], y[targets] - y[sources])
+    order = np.argsort(sources, kind="stable")
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(sources, minlength=len(used)))])
+    return StreetGraph(lons, lats, indptr, targets[order], lengths[order])
+
+
+def load_street_graph(city, mode):
+    """The street graph of a city and mode, read from its extract once per process."""
+    key = (city, mode)
+    with _cache_lock:
+        if key not in _graph_cache:
+            path = find_extract(city)
+            if path is None:
+                raise FileNotFoundError(f"OSM extract for {city} not found in {OSM_DIR}.")
+            if path not in _osm_cache:
+                _osm_cache[path] = read_osm(path)
+            _graph_cache[key] = build_street_graph(_osm_cache[path], mode)
+        return _graph_cache[key]
+
+
+def multi_source_dijkstra(graph, sources, initial_costs, weights, cutoff):
+    """
+    Shortest travel cost from the closest source to every node, up to `cutoff`.
+
+    Returns:
+        tuple: (cost per node, inf if unreached; index of the closest source per node, -1 if unreached)
+    """
+    n = len(graph.indptr) - 1
+    cost = [float("inf")] * n
+    label = [-1] * n
+    indptr, indices, weights = graph.indptr.tolist(), graph.indices.tolist(), weights.tolist()
+
+    heap = []
+    for source_index, (node, initial) in enumerate(zip(sources, initial_costs)):
+        if initial < cost[node]:
+            cost[node], label[node] = initial, source_index
+            heap.append((initial, node))
+    heapq.heapify(heap)
+
+    while heap:
+        current, node = heapq.heappop(heap)
+        if current > cost[node]:
+            continue
+        for edge in range(indptr[node], indptr[node + 1]):
+            target = indices[edge]
+            candidate = current + weights[edge]
+            if candidate < cost[target] and candidate <= cutoff:
+                cost[target], label[target] = candidate, label[node]
+                heapq.heappush(heap, (candidate, target))
+    return np.array(cost), np.array(label)
+
+
+def calculate_isochrones_local(poi_coords, mode, time_minutes, on_batch=None, city=None):
+    """
+    Calculate the isochrones of a list of POIs on the local street graph, in a single pass.
+
+    Same signature and output as `utils.calculate_isochrones`, so that the two can be swapped.
+
+    Args:
+        poi_coords (list of dict or DataFrame): POIs with keys 'lat' and 'lon'.
+        mode (str): 'foot-walking', 'cycling-regular' or 'driving-car'.
+        time_minutes (int): Travel time in minutes.
+        on_batch (callable): Called once with the list of isochrones, unless it is empty.
+        city (str): City whose extract is used; if omitted, the only extract available.
+
+    Returns:
+        list of dict: GeoJSON geometries, one per POI that reaches the street graph.
+    """
+    if city is None:
+        extracts = glob.glob(os.path.join(OSM_DIR, "*.osm*"))
+        if len(extracts) != 1:
+            raise ValueError("calculate_isochrones_local, specificare la città dell'estratto OSM")
+        city = os.path.basename(extracts[0]).split(".osm")[0]
+
+    stations = pd.DataFrame(poi_coords, columns=["lat", "lon"])
+    if stations.empty:
+        return []
+    with stage("street_graph", city=city, mode=mode):
+        graph = load_street_graph(city, mode)
+    speed = MODE_SPEEDS_KMH.get(mode, MODE_SPEEDS_KMH["foot-walking"]) / 3.6
+    budget = time_minutes * 60
+    lat0 = float(np.mean(graph.lats))
+
+    # Snap every station to its nearest street node, paying the snap distance at the mode speed
+    node_x, node_y = project(graph.lats, graph.lons, lat0)
+    station_x, station_y = project(stations["lat"], stations["lon"], lat0)
+    tree = shapely.STRtree(shapely.points(node_x, node_y))
+    nearest = tree.query_nearest(shapely.points(station_x, station_y), return_distance=True, all_matches=False)
+    (station_index, node_index), snap_distance = nearest
+    reachable = snap_distance <= MAX_SNAP_M
+    station_index, node_index, snap_distance = station_index[reachable], node_index[reachable], snap_distance[reachable]
+
+    with stage("dijkstra", nodes=len(graph.indptr) - 1, sources=len(node_index)):
+        cost, label = multi_source_dijkstra(graph, node_index, snap_distance / speed, graph.lengths / speed, budget)
+
+    # Reachable part of every edge leaving a reached node, clipped where the budget runs out
+    edge_source = np.repeat(np.arange(len(cost)), np.diff(graph.indptr))
+    edge_target = graph.indices
+    reached = cost[edge_source] <= budget
+    edge_source, edge_target = edge_source[reached], edge_target[reached]
+    edge_cost = graph.lengths[reached] / speed
+    fraction = np.clip((budget - cost[edge_source]) / np.maximum(edge_cost, 1e-9), 0, 1)[:, None]
+    start = np.column_stack([node_x[edge_source], node_y[edge_source]])
+    end = np.column_stack([node_x[edge_target], node_y[edge_target]])
+    segments = np.stack([start, start + (end - start) * fraction], axis=1)
+    segment_label = label[edge_source]
+
+    # Stations reached only through their own snap point still get a small area around it
+    labels = np.concatenate([segment_label, np.arange(len(station_index))])
+    snap_points = np.column_stack([node_x[node_index], node_y[node_index]])
+    segments = np.concatenate([segments, np.stack([snap_points, snap_points], axis=1)])
+    order = np.argsort(labels, kind="stable")
+    labels, segments = labels[order], segments[order]
+
+    lines = shapely.linestrings(segments)
+    multilines = shapely.multilinestrings(lines, indices=labels)
+    with stage("street_buffer"):
+        areas = shapely.buffer(multilines, BUFFER_M, quad_segs=4)
+
+    # Back to lon/lat
+    scale = np.array([111320 * np.cos(np.radians(lat0)), 110540])
+    areas = shapely.transform(areas, lambda coords: coords / scale)
+
+    isochrones = [mapping(area) for area in areas if not area.is_empty]
+    if isochrones and on_batch is not None:
+        on_batch(isochrones)
+    return isochrones
@@ -0,0 +1,179 @@
+"""
+The search-area pipeline, split into stages memoized on their real inputs.
+
+    stations -> selection -> isochrones -> dissolve -> connect -> simplify -> links
+
+Only the links depend on the house filters, so changing a price or the number of rooms
+reuses every geometric stage and just formats the links again.
+"""
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from shapely.geometry import shape
+
+from instrumentation import metrics, stage
+from isochrone_engine import LADDER_MINUTES
+from utils import get_prepared_boundary, clean_poi_dataset, normalize_poi_types, calculate_isochrones, IncrementalDissolver, connect_polygons, count_vertices
+from link_generator import create_link_immobiliare, create_link_idealista, serialize_vertices, MAX_AREA_LENGTH
+from polyline_codec import shape_param
+from station_store import load_stations
+from station_selection import select_stations, DEFAULT_BUDGET
+from local_isochrones import calculate_isochrones_local
+from simplification import simplify_to_budget
+from precompute import load_precomputed
+
+
+# Stations are read again after this many seconds, so that snapshots refreshed in the
+# background (see `station_store.load_stations`) reach the running app
+STATIONS_MAX_AGE = 3600
+
+
+def memoize(maxsize=32, ignore=(), max_age=None):
+    """
+    Process-wide LRU memoization, shared by every Streamlit session. None results are not
+    stored, so that a failed stage is retried on the next call.
+
+    Parameters:
+    - maxsize: number of results kept
+    - ignore: names of keyword arguments left out of the key, e.g. progress callbacks
+    - max_age: seconds after which a result is computed again (None keeps it until evicted)
+    """
+    def decorator(function):
+        results = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            key = args + tuple(sorted((name, value) for name, value in kwargs.items() if name not in ignore))
+            with lock:
+                if key in results and max_age is not None and time.monotonic() - results[key][0] > max_age:
+                    del results[key]
+                if key in results:
+                    results.move_to_end(key)
+                    metrics.inc("cache_lookups_total", cache=function.__name__, result="hit")
+                    return results[key][1]
+            metrics.inc("cache_lookups_total", cache=function.__name__, result="miss")
+            result = function(*args, **kwargs)
+            if result is None:
+                return result
+            with lock:
+                results[key] = (time.monotonic(), result)
+                while len(results) > maxsize:
+                    results.popitem(last=False)
+            return result
+
+        def cache_clear():
+            with lock:
+                results.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+@memoize(maxsize=16, max_age=STATIONS_MAX_AGE)
+def find_stations(city, station_types):
+    """
+    Stations of the given types within the city boundary, as one DataFrame with a 'type'
+    column. `station_types` is a type or a tuple of types, see `utils.normalize_poi_types`.
+    """
+    return clean_poi_dataset(load_stations(city, station_types), get_prepared_boundary(city))
+
+
+@memoize(maxsize=64, max_age=STATIONS_MAX_AGE)
+def search_stations(city, station_types, mode, minutes, backend="ors"):
+    """
+    The stations whose isochrones make up the search area. Stations of different types are
+    selected together, so a tram stop next to a metro station costs no extra request. The
+    request budget only applies to OpenRouteService: the local backend handles every station
+    in the same graph pass.
+    """
+    budget = None if backend == "local" else DEFAULT_BUDGET
+    stations = find_stations(city, station_types)
+    with stage("select_stations") as fields:
+        selected = select_stations(stations, mode, minutes, budget=budget)
+        fields.update(stations=len(stations), selected=len(selected))
+    return selected
+
+
+def compute_search_area(city, station_types, mode, minutes, backend="ors", on_partial=None, on_error=None):
+    """
+    Compute the connected search area of a query, as a shapely geometry (None without isochrones).
+
+    `backend` selects how isochrones are computed: "ors" calls OpenRouteService, "local" uses
+    the street graph of the city's OSM extract (see `local_isochrones`). `on_partial`, if given,
+    is called with the dissolved area received so far after every isochrone request, and
+    `on_error` with the exception if the isochrone requests fail.
+
+    With OpenRouteService the whole `LADDER_MINUTES` ladder is requested for every station in
+    the same calls, so that a later search with another travel time on the ladder only reads
+    the cache.
+    """
+    dissolver = IncrementalDissolver()
+
+    def add_batch(batch):
+        dissolver.add(batch)
+        if on_partial is not None:
+            on_partial(dissolver.geometry)
+
+    if backend == "local":
+        calculate = functools.partial(calculate_isochrones_local, city=city)
+    else:
+        calculate = functools.partial(calculate_isochrones, ladder=LADDER_MINUTES, on_error=on_error)
+    with stage("search_area", city=city, station_types="+".join(normalize_poi_types(station_types)), mode=mode,
+               minutes=minutes, backend=backend):
+        isochrones = calculate(search_stations(city, station_types, mode, minutes, backend), mode, minutes,
+                               on_batch=add_batch)
+        # A failed request returns no isochrones: drop the partial area instead of caching it
+        if not isochrones:
+            return None
+        polygons = dissolver.polygons()
+        metrics.vertices("dissolve", sum(count_vertices(shape(isochrone)) for isochrone in isochrones),
+                         sum(count_vertices(polygon) for polygon in polygons))
+        return connect_polygons(polygons, disjoint=True)
+
+
+@memoize(maxsize=64, ignore=("on_partial", "on_error"))
+def build_search_area(city, station_types, mode, minutes, backend="ors", on_partial=None, on_error=None):
+    """
+    The connected search area of a query: read from the precomputed artifact when the
+    combination is there, computed otherwise (see `compute_search_area`).
+    """
+    if backend == "ors":
+        area = load_precomputed(city, station_types, mode, minutes)
+        metrics.inc("cache_lookups_total", cache="precomputed", result="miss" if area is None else "hit")
+        if area is not None:
+            return area
+    return compute_search_area(city, station_types, mode, minutes, backend, on_partial=on_partial, on_error=on_error)
+
+
+def link_area_length(geom):
+    """Length of the longest serialization of the area among the portal links."""
+    return max(len(serialize_vertices(geom)), len(shape_param(geom)))
+
+
+@memoize(maxsize=64)
+def simplify_search_area(city, station_types, mode, minutes, backend="ors"):
+    """The search area simplified just enough to fit in the portal links (a `SimplifiedGeometry`)."""
+    area = build_search_area(city, station_types, mode, minutes, backend)
+    if area is None:
+        return None
+    with stage("simplify"):
+        simplified = simplify_to_budget(area, max_length=MAX_AREA_LENGTH, measure=link_area_length)
+    metrics.vertices("simplify", simplified.original_vertices, simplified.vertices)
+    return simplified
+
+
+def build_links(area, priceMin, priceMax, areaMin, areaMax, roomsMin, roomsMax, n_bagni, typology, fascia_piano, asta):
+    """
+    The Immobiliare.it and Idealista.it search links of an area with the given house filters.
+
+    Returns:
+        tuple: (link_immobiliare, link_idealista)
+    """
+    link_immobiliare = create_link_immobiliare(area, priceMin, priceMax, areaMin, areaMax, roomsMin, roomsMax,
+                                               n_bagni, typology, fascia_piano, asta)
+    link_idealista = create_link_idealista(area, priceMax, priceMin, areaMin, areaMax, roomsMin, roomsMax, n_bagni)
+    return link_immobiliare, link_idealista
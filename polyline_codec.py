@@ -0,0 +1,126 @@
+"""
+NumPy implementation of Google's Encoded Polyline Algorithm, used by the Idealista.it `shape`
+parameter, plus helpers for Idealista's `((...),(...))` multi-ring wrapper.
+
+Encoding and decoding work on whole coordinate arrays (delta, zigzag and 5-bit chunking are
+array operations), and the output is identical to the `polyline` package.
+"""
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+
+
+def encode(coords, precision=5):
+    """
+    Encode a sequence of coordinates in a polyline string.
+
+    Args:
+        coords (array-like): Shape (n, 2), in (lat, lng) order.
+        precision (int): Decimals kept, 5 for Google Maps and Idealista, 6 for OSRM.
+
+    Returns:
+        str: The encoded polyline.
+    """
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    if len(coords) == 0:
+        return ""
+
+    # Round half away from zero, like the reference implementation
+    scaled = coords * 10 ** precision
+    values = np.copysign(np.floor(np.abs(scaled) + 0.5), scaled).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    # Split every value in 5-bit chunks, least significant first, with 0x20 on all but the last
+    n_chunks = max(1, (int(zigzag.max()).bit_length() + 4) // 5)
+    shifts = 5 * np.arange(n_chunks)
+    shifted = zigzag[:, None] >> shifts
+    lengths = np.maximum(1, (shifted > 0).sum(axis=1))
+    chunks = shifted & 0x1F
+    chunks[np.arange(n_chunks) < (lengths - 1)[:, None]] |= 0x20
+    used = np.arange(n_chunks) < lengths[:, None]
+    return (chunks[used] + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode(encoded, precision=5):
+    """
+    Decode a polyline string.
+
+    Args:
+        encoded (str): The encoded polyline.
+        precision (int): Decimals used when encoding.
+
+    Returns:
+        ndarray: Shape (n, 2), in (lat, lng) order.
+    """
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if len(chunks) == 0:
+        return np.empty((0, 2))
+    if np.any((chunks < 0) | (chunks > 63)):
+        raise ValueError("decode, caratteri non validi nella polyline")
+
+    ends = (chunks & 0x20) == 0
+    if not ends[-1]:
+        raise ValueError("decode, polyline troncata")
+    starts = np.flatnonzero(np.concatenate([[True], ends[:-1]]))
+    if len(starts) % 2:
+        raise ValueError("decode, numero dispari di valori nella polyline")
+
+    # Position of every chunk within its value, then reassemble the values
+    group = np.cumsum(np.concatenate([[0], ends[:-1]]))
+    position = np.arange(len(chunks)) - starts[group]
+    values = np.add.reduceat((chunks & 0x1F) << (5 * position), starts)
+    deltas = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def encode_shape(geom, precision=5):
+    """
+    Encode the exterior ring of every polygon of a geometry in Idealista's wrapper: "((a),(b))".
+
+    Args:
+        geom (Polygon or MultiPolygon): Search area.
+        precision (int): Decimals kept.
+
+    Returns:
+        str: The wrapped polylines, not yet percent-encoded.
+    """
+    if isinstance(geom, Polygon):
+        polygons = [geom]
+    elif isinstance(geom, MultiPolygon):
+        polygons = list(geom.geoms)
+    else:
+        raise TypeError("encode_shape, L'oggetto deve essere un shapely.geometry.Polygon o MultiPolygon")
+
+    encoded = [encode(shapely.get_coordinates(polygon.exterior)[:, ::-1], precision) for polygon in polygons]
+    return "((" + "),(".join(encoded) + "))"
+
+
+def decode_shape(wrapped, precision=5):
+    """
+    Decode Idealista's wrapper back into a shapely geometry.
+
+    Returns:
+        Polygon or MultiPolygon: One polygon per polyline in the wrapper.
+    """
+    if not (wrapped.startswith("((") and wrapped.endswith("))")):
+        raise ValueError("decode_shape, formato non valido: atteso '((...))'")
+
+    polygons = [Polygon(decode(part, precision)[:, ::-1]) for part in wrapped[2:-2].split("),(")]
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+def shape_param(geom, precision=5):
+    """The percent-encoded `shape` URL parameter of an Idealista.it search."""
+    return quote(encode_shape(geom, precision), safe='')
+
+
+def geometry_from_url(url, precision=5):
+    """Return the search area of an Idealista.it URL, read from its `shape` parameter."""
+    params = parse_qs(urlparse(url).query)
+    if "shape" not in params:
+        raise ValueError("geometry_from_url, parametro 'shape' non trovato nell'URL")
+    # parse_qs already percent-decodes; unquote again in case the parameter was double-encoded
+    return decode_shape(unquote(params["shape"][0]), precision)
@@ -1,21 +1,12 @@
-import polyline
-from shapely.geometry import Polygon
-import streamlit as st
-from urllib.parse import quote
+from shapely.geometry import Polygon, MultiPolygon
 
+from polyline_codec import shape_param
 
-def encode_polyline_from_shape(polygon: Polygon) -> str:
-    if not isinstance(polygon, Polygon):
-        raise TypeError("encode_polyline_from_shape, L'oggetto deve essere un shapely.geometry.Polygon")
 
-    # Estrai coordinate come lista [lat, lng]
-    coords = [(lat, lng) for lng, lat in polygon.exterior.coords]
+def encode_polyline_from_shape(polygon: Polygon | MultiPolygon, precision: int = 5) -> str:
+    if not isinstance(polygon, (Polygon, MultiPolygon)):
+        raise TypeError("encode_polyline_from_shape, L'oggetto deve essere un shapely.geometry.Polygon o MultiPolygon")
 
-    # Codifica in polyline string
-    encoded = polyline.encode(coords)
-
-    # Avvolgi in doppie parentesi
-    wrapped = f"(({encoded}))"
-
-    # Percent-encode per l'URL
-    return quote(wrapped, safe='')
+    # Codifica il contorno esterno di ogni poligono come polyline [lat, lng], avvolta in
+    # doppie parentesi (un gruppo per poligono) e percent-encoded per l'URL
+    return shape_param(polygon, precision)
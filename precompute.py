@@ -0,0 +1,133 @@
+"""
+Precomputed search areas for the most common queries.
+
+The connected search area of every (city, station types, mode, minutes) combination is built
+offline and stored as a WKB file, indexed by key in `data/search_areas/v<version>/index.json`,
+so that the app answers common queries with a single file read. Build them with:
+
+    python precompute.py --cities Milano Roma Torino --minutes 5 10 15 20 30
+    python precompute.py --types subway+tram      # types searched together
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+import shapely
+
+from isochrone_engine import LADDER_MINUTES
+from utils import normalize_poi_types
+
+ARTIFACT_VERSION = 1
+ARTIFACT_DIR = os.path.join("data", "search_areas", f"v{ARTIFACT_VERSION}")
+INDEX_PATH = os.path.join(ARTIFACT_DIR, "index.json")
+
+CITIES = ("Milano", "Roma", "Torino")
+STATION_TYPES = ("subway", "tram", "bus")
+MODES = ("foot-walking", "cycling-regular", "driving-car")
+MINUTES = LADDER_MINUTES
+
+_index = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def area_key(city, station_types, mode, minutes):
+    return f"{city}_{'+'.join(normalize_poi_types(station_types))}_{mode}_{minutes}"
+
+
+def read_index():
+    """The artifact index, reloaded only when the file changes. Empty if there is no artifact."""
+    global _index, _index_mtime
+    try:
+        mtime = os.path.getmtime(INDEX_PATH)
+    except OSError:
+        return {}
+    with _index_lock:
+        if mtime != _index_mtime:
+            with open(INDEX_PATH, "r") as file:
+                index = json.load(file)
+            _index = index if index.get("version") == ARTIFACT_VERSION else {}
+            _index_mtime = mtime
+        return _index.get("areas", {})
+
+
+def load_precomputed(city, station_types, mode, minutes):
+    """
+    Return the precomputed search area of a query as a shapely geometry, or None if the
+    combination was not precomputed.
+    """
+    entry = read_index().get(area_key(city, station_types, mode, minutes))
+    if entry is None:
+        return None
+    with open(os.path.join(ARTIFACT_DIR, entry["file"]), "rb") as file:
+        return shapely.from_wkb(file.read())
+
+
+def save_precomputed(city, station_types, mode, minutes, geometry):
+    """Write the area of a query and add it to the index, atomically."""
+    key = area_key(city, station_types, mode, minutes)
+    os.makedirs(ARTIFACT_DIR, exist_ok=True)
+    filename = f"{key}.wkb"
+    _write_atomic(os.path.join(ARTIFACT_DIR, filename), shapely.to_wkb(geometry))
+
+    areas = dict(read_index())
+    areas[key] = {
+        "file": filename,
+        "built_at": time.time(),
+        "vertices": int(shapely.get_num_coordinates(geometry)),
+    }
+    index = {"version": ARTIFACT_VERSION, "built_at": time.time(), "areas": areas}
+    _write_atomic(INDEX_PATH, json.dumps(index, indent=1, sort_keys=True).encode())
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the search areas of common queries.")
+    parser.add_argument("--cities", nargs="+", default=list(CITIES))
+    parser.add_argument("--types", nargs="+", type=normalize_poi_types, default=[(t,) for t in STATION_TYPES],
+                        help="station types, several joined by '+' to search them together (e.g. subway+tram)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--minutes", nargs="+", type=int, default=list(MINUTES))
+    parser.add_argument("--force", action="store_true", help="rebuild combinations already in the artifact")
+    args = parser.parse_args()
+
+    from pipeline import compute_search_area
+
+    failed = []
+    for city, station_types, mode, minutes in itertools.product(args.cities, args.types, args.modes, args.minutes):
+        key = area_key(city, station_types, mode, minutes)
+        if key in read_index() and not args.force:
+            print(f"{key}: already built")
+            continue
+        start = time.perf_counter()
+        # A missing city boundary or a failed download only skips its combination; the ORS
+        # errors are not raised by `calculate_isochrones`, so they are collected through on_error
+        errors = []
+        try:
+            geometry = compute_search_area(city, station_types, mode, minutes, on_error=errors.append)
+            if geometry is None:
+                raise errors[0] if errors else RuntimeError("no isochrones")
+            save_precomputed(city, station_types, mode, minutes, geometry)
+        except Exception as e:
+            print(f"{key}: failed, {type(e).__name__}: {e}", file=sys.stderr)
+            failed.append(key)
+            continue
+        print(f"{key}: built in {time.perf_counter() - start:.1f}s")
+
+    if failed:
+        print(f"{len(failed)} combinations failed: {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Map rendering of the search area with a small browser payload.
+
+The area is simplified to what is visible at the zoom of the map (about one pixel) and its
+coordinates are snapped to a grid of `COORD_PRECISION` decimals, so the deck sent to the
+browser holds a single compact GeoJSON feature instead of every vertex of the full area.
+Polygons, MultiPolygons and holes are all drawn by the same GeoJsonLayer.
+"""
+import math
+import time
+from dataclasses import dataclass
+
+import pydeck as pdk
+import shapely
+from shapely.geometry import mapping
+
+
+# 5 decimals of a degree are about 1 m, well below a pixel at city zooms
+COORD_PRECISION = 5
+TILE_SIZE = 512
+MAP_WIDTH_PX = 700
+AREA_COLOR = [0, 222, 77, 75]
+
+
+@dataclass(frozen=True)
+class AreaPayload:
+    data: dict
+    vertices: int
+    original_vertices: int
+    tolerance: float
+
+
+@dataclass(frozen=True)
+class RenderedDeck:
+    deck: pdk.Deck
+    # Size of the JSON sent to the browser and time spent building it
+    payload_bytes: int
+    render_s: float
+    vertices: int
+
+
+def fit_zoom(bounds, width_px=MAP_WIDTH_PX, max_zoom=15):
+    """Web-mercator zoom at which `bounds` (minx, miny, maxx, maxy) fits `width_px` pixels."""
+    minx, miny, maxx, maxy = bounds
+    lat = math.radians((miny + maxy) / 2)
+    span = max(maxx - minx, (maxy - miny) / max(math.cos(lat), 1e-6), 1e-6)
+    return max(0, min(max_zoom, math.log2(360 * width_px / (TILE_SIZE * span))))
+
+
+def pixel_tolerance(zoom, pixels=1.0):
+    """Size in degrees of `pixels` screen pixels at `zoom`."""
+    return pixels * 360 / (TILE_SIZE * 2 ** zoom)
+
+
+def area_payload(geom, zoom, precision=COORD_PRECISION, pixels=1.0):
+    """
+    GeoJSON FeatureCollection of an area simplified and quantized for the given zoom.
+
+    Parameters:
+    - geom: shapely Polygon or MultiPolygon
+    - zoom: zoom of the map the area is drawn on
+    - precision: decimals kept in the coordinates
+    - pixels: simplification tolerance, in screen pixels
+
+    Returns:
+    - AreaPayload with the GeoJSON data and the vertex counts before and after
+    """
+    tolerance = pixel_tolerance(zoom, pixels)
+    simplified = shapely.simplify(geom, tolerance, preserve_topology=True)
+    # Snapping to the grid also removes the vertices that collapse onto each other
+    quantized = shapely.set_precision(simplified, 10 ** -precision)
+    feature = {"type": "Feature", "properties": {}, "geometry": mapping(quantized)}
+    return AreaPayload(
+        data={"type": "FeatureCollection", "features": [feature]},
+        vertices=int(shapely.get_num_coordinates(quantized)),
+        original_vertices=int(shapely.get_num_coordinates(geom)),
+        tolerance=tolerance,
+    )
+
+
+def area_layer(payload, color=AREA_COLOR):
+    return pdk.Layer(
+        "GeoJsonLayer",
+        data=payload.data,
+        get_fill_color=color,
+        stroked=False,
+        pickable=False,
+    )
+
+
+def stations_layer(stations, precision=COORD_PRECISION):
+    """Scatterplot of the stations, sending only their rounded position and name."""
+    columns = [column for column in ("lon", "lat", "name") if column in stations]
+    data = stations[columns].round({"lon": precision, "lat": precision})
+    return pdk.Layer(
+        "ScatterplotLayer",
+        data=data,
+        get_position=["lon", "lat"],
+        get_fill_color=[255, 0, 0, 100],
+        get_radius=150,
+        pickable=True,
+        auto_highlight=True,
+    )
+
+
+def vertices_layer(geom):
+    """Debug scatterplot of every vertex of a geometry, holes and all polygons included."""
+    coordinates = shapely.get_coordinates(geom)
+    return pdk.Layer(
+        "ScatterplotLayer",
+        data=[{"lon": lon, "lat": lat} for lon, lat in coordinates.tolist()],
+        get_position=["lon", "lat"],
+        get_fill_color=[255, 255, 0, 200],
+        get_radius=5,
+        pickable=True,
+        auto_highlight=True,
+    )
+
+
+def view_state(bounds, width_px=MAP_WIDTH_PX):
+    """View centered on `bounds` at the zoom that fits them."""
+    minx, miny, maxx, maxy = bounds
+    return pdk.ViewState(latitude=(miny + maxy) / 2, longitude=(minx + maxx) / 2, zoom=fit_zoom(bounds, width_px))
+
+
+def render_area(geom, stations=None, show_vertices=False, view=None, **deck_kwargs):
+    """
+    Build the deck of a search area, measuring the size of its browser payload.
+
+    Parameters:
+    - geom: shapely Polygon or MultiPolygon
+    - stations: DataFrame with 'lat', 'lon' and 'name', drawn on top of the area
+    - show_vertices: also draw every vertex of `geom`, for debugging
+    - view: pdk.ViewState; fitted to the area if omitted
+    - deck_kwargs: passed to pdk.Deck, e.g. map_style or tooltip
+
+    Returns:
+    - RenderedDeck
+    """
+    start = time.perf_counter()
+    view = view or view_state(geom.bounds)
+    payload = area_payload(geom, view.zoom)
+    layers = [area_layer(payload)]
+    if stations is not None:
+        layers.append(stations_layer(stations))
+    if show_vertices:
+        layers.append(vertices_layer(geom))
+    deck = pdk.Deck(layers=layers, initial_view_state=view, **deck_kwargs)
+    payload_bytes = len(deck.to_json().encode())
+    return RenderedDeck(deck, payload_bytes, time.perf_counter() - start, payload.vertices)
+
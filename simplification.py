@@ -0,0 +1,73 @@
+"""
+Simplification of the search area to a vertex or URL-length budget.
+
+Instead of a fixed tolerance, the smallest tolerance that meets the budget is searched by
+bisection over `shapely.simplify`, so the area is simplified only as much as the portal
+links require.
+"""
+from dataclasses import dataclass
+
+from shapely.geometry.base import BaseGeometry
+
+from utils import count_vertices
+
+
+@dataclass(frozen=True)
+class SimplifiedGeometry:
+    geometry: BaseGeometry
+    tolerance: float
+    vertices: int
+    original_vertices: int
+    # Area of the symmetric difference with the original, relative to the original area
+    area_error: float
+
+
+def simplify_to_budget(geom, max_vertices=None, max_length=None, measure=None,
+                       start_tolerance=1e-4, max_tolerance=0.05, iterations=12):
+    """
+    Simplify a Polygon or MultiPolygon with the smallest tolerance that fits the budget.
+
+    Parameters:
+    - geom: shapely Polygon or MultiPolygon
+    - max_vertices: int, maximum number of vertices of the result
+    - max_length: int, maximum value of `measure(result)`, e.g. the length of a link
+    - measure: callable taking a geometry and returning its length (required with `max_length`)
+    - start_tolerance: float, first tolerance tried, doubled until the budget is met
+    - max_tolerance: float, tolerance used if the budget cannot be met below it
+    - iterations: int, bisection steps between the last failing and the first fitting tolerance
+
+    Returns:
+    - SimplifiedGeometry with the geometry, the tolerance used, vertex counts and the area error
+    """
+    if max_length is not None and measure is None:
+        raise ValueError("simplify_to_budget, max_length richiede una funzione measure")
+
+    def fits(candidate):
+        if max_vertices is not None and count_vertices(candidate) > max_vertices:
+            return False
+        if max_length is not None and measure(candidate) > max_length:
+            return False
+        return True
+
+    def simplify(tolerance):
+        return geom.simplify(tolerance, preserve_topology=True) if tolerance > 0 else geom
+
+    # Grow the tolerance geometrically until the budget is met, then bisect in between
+    low, high = 0.0, start_tolerance
+    if not fits(geom):
+        candidate = simplify(high)
+        while not fits(candidate) and high < max_tolerance:
+            low, high = high, min(high * 2, max_tolerance)
+            candidate = simplify(high)
+        for _ in range(iterations):
+            middle = (low * high) ** 0.5 if low > 0 else high / 2
+            if fits(simplify(middle)):
+                high = middle
+            else:
+                low = middle
+    else:
+        high = 0.0
+
+    result = simplify(high)
+    area_error = geom.symmetric_difference(result).area / geom.area if geom.area else 0.0
+    return SimplifiedGeometry(result, high, count_vertices(result), count_vertices(geom), area_error)
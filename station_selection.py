@@ -0,0 +1,158 @@
+"""
+Selection of the stations to compute isochrones for.
+
+Instead of taking the first N stations returned by Overpass, the whole city is considered:
+stops closer than a merge distance (platform pairs, clusters of bus stops) are merged,
+then stations are picked greedily by how much uncovered area their isochrone would add,
+until the request budget is spent or every remaining station is already covered.
+"""
+import heapq
+
+import numpy as np
+import pandas as pd
+
+
+# Average speeds used to estimate the reach of an isochrone before computing it
+MODE_SPEEDS_KMH = {
+    "foot-walking": 5.0,
+    "cycling-regular": 15.0,
+    "cycling-electric": 20.0,
+    "driving-car": 30.0,
+}
+# Ratio between straight-line and street-network distance
+DETOUR_FACTOR = 1.3
+
+MERGE_DISTANCE_M = 100
+DEFAULT_BUDGET = 60
+MIN_GAIN = 0.15
+# Cells per isochrone radius in the coverage grid
+GRID_RESOLUTION = 3
+
+
+def project(lats, lons, lat0=None):
+    """Equirectangular projection to meters around `lat0`, accurate enough at city scale."""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if lat0 is None:
+        lat0 = lats.mean() if len(lats) else 0.0
+    x = lons * 111320 * np.cos(np.radians(lat0))
+    y = lats * 110540
+    return x, y
+
+
+def isochrone_radius(mode, time_minutes):
+    """Estimated straight-line radius in meters of an isochrone."""
+    return MODE_SPEEDS_KMH.get(mode, MODE_SPEEDS_KMH["foot-walking"]) / 3.6 * time_minutes * 60 / DETOUR_FACTOR
+
+
+def deduplicate_stations(stations, merge_distance=MERGE_DISTANCE_M):
+    """
+    Merge stops closer than `merge_distance` meters into a single station at their centroid.
+
+    Args:
+        stations (list of dict or DataFrame): Stations with keys 'lat', 'lon', 'name' and
+            optionally 'id' and 'type'.
+        merge_distance (float): Distance in meters under which two stops are merged.
+
+    Returns:
+        DataFrame: Columns 'lat', 'lon', 'name', 'id' and 'type' if given, and 'stops' (number
+            of merged stops). A merged station keeps the name, id and type of its first stop.
+    """
+    stations = pd.DataFrame(stations)
+    extra = [column for column in ("id", "type") if column in stations]
+    stations = stations.reindex(columns=["lat", "lon", "name", *extra])
+    n = len(stations)
+    if n == 0 or merge_distance <= 0:
+        return stations.assign(stops=1)
+
+    x, y = project(stations["lat"], stations["lon"])
+    cells = np.floor(np.column_stack([x, y]) / merge_distance).astype(np.int64)
+
+    # Union-find over pairs of stops within merge_distance, looking only at neighbouring grid cells
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    grid = {}
+    for i, cell in enumerate(map(tuple, cells)):
+        grid.setdefault(cell, []).append(i)
+    for (cx, cy), members in grid.items():
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for j in grid.get((cx + dx, cy + dy), ()):
+                    for i in members:
+                        if i < j and (x[i] - x[j]) ** 2 + (y[i] - y[j]) ** 2 <= merge_distance ** 2:
+                            root_i, root_j = find(i), find(j)
+                            if root_i != root_j:
+                                parent[root_j] = root_i
+
+    groups = np.array([find(i) for i in range(n)])
+    merged = stations.groupby(groups, sort=False).agg(
+        lat=("lat", "mean"), lon=("lon", "mean"), name=("name", "first"),
+        **{column: (column, "first") for column in extra}, stops=("name", "size"),
+    )
+    return merged.reset_index(drop=True)
+
+
+def select_stations(stations, mode, time_minutes, budget=DEFAULT_BUDGET,
+                    merge_distance=MERGE_DISTANCE_M, min_gain=MIN_GAIN):
+    """
+    Pick the stations whose isochrones cover the city with the fewest API calls.
+
+    Each isochrone is approximated by a disc of radius `isochrone_radius(mode, time_minutes)`
+    rasterized on a grid. Stations are chosen greedily by the number of still uncovered cells
+    they add, ties broken by the number of merged stops; stations adding less than `min_gain`
+    of a disc are considered covered by their neighbours and dropped.
+
+    Args:
+        stations (list of dict or DataFrame): Stations with keys 'lat', 'lon' and 'name'.
+        mode (str): ORS profile, e.g. 'foot-walking'.
+        time_minutes (int): Travel time in minutes.
+        budget (int): Maximum number of stations returned (None for no limit).
+        merge_distance (float): Distance in meters under which stops are merged.
+        min_gain (float): Minimum fraction of new area a station must add to be selected.
+
+    Returns:
+        DataFrame: Selected stations in priority order, with the columns of `deduplicate_stations`.
+    """
+    stations = deduplicate_stations(stations, merge_distance)
+    if stations.empty:
+        return stations
+
+    radius = isochrone_radius(mode, time_minutes)
+    cell_size = radius / GRID_RESOLUTION
+    x, y = project(stations["lat"], stations["lon"])
+    cx = np.floor(x / cell_size).astype(np.int64)
+    cy = np.floor(y / cell_size).astype(np.int64)
+
+    # Offsets of the grid cells whose center falls within one radius
+    offsets = np.arange(-GRID_RESOLUTION, GRID_RESOLUTION + 1)
+    dx, dy = np.meshgrid(offsets, offsets)
+    inside = dx ** 2 + dy ** 2 <= GRID_RESOLUTION ** 2
+    dx, dy = dx[inside], dy[inside]
+    stride = np.int64(1 << 32)
+    covered_cells = (cx[:, None] + dx) * stride + (cy[:, None] + dy)
+    disc_cells = covered_cells.shape[1]
+
+    # Lazy greedy maximum coverage: gains only decrease, so a stale heap entry is an upper bound
+    stops = stations["stops"].to_numpy()
+    heap = [(-disc_cells, -stops[i], i) for i in range(len(stations))]
+    heapq.heapify(heap)
+    covered = set()
+    selected = []
+    while heap and (budget is None or len(selected) < budget):
+        neg_gain, neg_stops, i = heapq.heappop(heap)
+        gain = sum(cell not in covered for cell in covered_cells[i].tolist())
+        if gain < min_gain * disc_cells:
+            continue
+        if gain < -neg_gain:
+            heapq.heappush(heap, (-gain, neg_stops, i))
+            continue
+        covered.update(covered_cells[i].tolist())
+        selected.append(i)
+
+    return stations.iloc[selected].reset_index(drop=True)
@@ -0,0 +1,185 @@
+"""
+Local snapshots of the public transport stations of each city.
+
+Stations are fetched from Overpass once and stored as Parquet files under `data/stations/`,
+one per city and type, so that the app can load them without a network round trip and a
+search combining several types reuses the snapshot of each. Refresh the snapshots with:
+
+    python station_store.py Milano Roma Torino --types subway tram bus
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils import POI_TYPES, normalize_poi_types, overpass_query, overpass_query_async
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.path.join("data", "stations")
+SNAPSHOT_VERSION = 2
+SNAPSHOT_MAX_AGE = 7 * 24 * 3600
+
+SCHEMA = pa.schema([
+    ("lat", pa.float64()),
+    ("lon", pa.float64()),
+    ("name", pa.string()),
+    ("id", pa.int64()),
+])
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def snapshot_path(city, poi_type):
+    return os.path.join(SNAPSHOT_DIR, f"{city}_{poi_type}.parquet")
+
+
+def save_snapshot(city, poi_type, stations, fetched_at=None):
+    """
+    Write the stations of a city to its snapshot file, atomically.
+
+    Args:
+        city (str): Name of the city.
+        poi_type (str): One of 'subway', 'tram', or 'bus'.
+        stations (list of dict or DataFrame): Stations with keys 'lat', 'lon', 'name' and 'id'.
+        fetched_at (float): Unix time of the Overpass query, defaults to now.
+    """
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    stations = pd.DataFrame(stations).reindex(columns=SCHEMA.names)
+    table = pa.Table.from_pandas(stations, schema=SCHEMA, preserve_index=False).replace_schema_metadata({
+        "version": str(SNAPSHOT_VERSION),
+        "fetched_at": str(fetched_at),
+        "city": city,
+        "poi_type": poi_type,
+    })
+    path = snapshot_path(city, poi_type)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, compression="zstd")
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(city, poi_type):
+    """
+    Read a station snapshot.
+
+    Returns:
+        tuple: (DataFrame with columns 'lat', 'lon', 'name', 'id' and 'type', fetched_at) or None if
+        there is no snapshot with the current version.
+    """
+    path = snapshot_path(city, poi_type)
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"version") != str(SNAPSHOT_VERSION).encode():
+        return None
+    stations = table.to_pandas()
+    stations["type"] = pd.Categorical([poi_type] * len(stations), categories=POI_TYPES)
+    return stations, float(metadata[b"fetched_at"])
+
+
+def save_snapshots(city, stations, poi_types):
+    """
+    Save the snapshot of each type with the stations of an `overpass_query` matching it, so
+    that a stop shared by several types is in the snapshot of each.
+    """
+    fetched_at = time.time()
+    for poi_type in normalize_poi_types(poi_types):
+        save_snapshot(city, poi_type, stations[stations[poi_type]], fetched_at)
+
+
+def refresh_snapshots(city, poi_types):
+    """Query Overpass once for all the types and overwrite their snapshots. Returns the fetched stations."""
+    stations = overpass_query(city, poi_types)
+    save_snapshots(city, stations, poi_types)
+    return stations
+
+
+def _refresh_in_background(city, poi_types):
+    with _refreshing_lock:
+        poi_types = [poi_type for poi_type in poi_types if (city, poi_type) not in _refreshing]
+        if not poi_types:
+            return
+        _refreshing.update((city, poi_type) for poi_type in poi_types)
+
+    def run():
+        try:
+            refresh_snapshots(city, poi_types)
+        except Exception as e:
+            logger.warning("Aggiornamento degli snapshot %s %s non riuscito: %s", city, "+".join(poi_types), e)
+        finally:
+            with _refreshing_lock:
+                _refreshing.difference_update((city, poi_type) for poi_type in poi_types)
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def load_stations(city, poi_types, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Load the stations of a city from the local snapshots of their types.
+
+    Stale snapshots are returned as they are and refreshed in a background thread; the types
+    without a snapshot are queried synchronously, all in one Overpass request, and stored.
+    A stop in the snapshots of several types is returned once, with the first of its types.
+
+    Args:
+        city (str): Name of the city.
+        poi_types (str or list of str): 'subway', 'tram', 'bus' or several of them
+            (see `utils.normalize_poi_types`).
+        max_age (float): Age in seconds after which a snapshot is refreshed.
+
+    Returns:
+        DataFrame: Stations with columns 'lat', 'lon', 'name', 'id' and 'type'.
+    """
+    frames, missing, stale = [], [], []
+    for poi_type in normalize_poi_types(poi_types):
+        snapshot = read_snapshot(city, poi_type)
+        if snapshot is None:
+            missing.append(poi_type)
+            continue
+        stations, fetched_at = snapshot
+        frames.append(stations)
+        if time.time() - fetched_at > max_age:
+            stale.append(poi_type)
+
+    if missing:
+        frames.append(refresh_snapshots(city, missing).drop(columns=missing))
+    if stale:
+        _refresh_in_background(city, stale)
+    stations = pd.concat(frames, ignore_index=True).sort_values("type", kind="stable")
+    return stations.drop_duplicates("id").reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch and store the station snapshots of one or more cities.")
+    parser.add_argument("cities", nargs="+", help="city names, as in OpenStreetMap (e.g. Milano)")
+    parser.add_argument("--types", nargs="+", choices=POI_TYPES, default=list(POI_TYPES))
+    args = parser.parse_args()
+
+    # One query per city for all the types, the cities concurrently within the limit of the
+    # Overpass endpoint
+    async def refresh(city):
+        start = time.perf_counter()
+        stations = await overpass_query_async(city, args.types)
+        save_snapshots(city, stations, args.types)
+        for poi_type in normalize_poi_types(args.types):
+            print(f"{city} {poi_type}: {stations[poi_type].sum()} stations -> {snapshot_path(city, poi_type)}")
+        print(f"{city}: {len(stations)} stations in {time.perf_counter() - start:.1f}s")
+
+    async def refresh_all():
+        await asyncio.gather(*(refresh(city) for city in args.cities))
+
+    asyncio.run(refresh_all())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
 from shapely.geometry import shape, Polygon, MultiPolygon
 from shapely.ops import unary_union
 import pydeck as pdk
 
-from utils import overpass_query, load_city_boundary, clean_poi_dataset, calculate_isochrones, dissolve_isochrone, connect_polygons, check_if_shapely_polygon, plot_polygon, count_vertices
-from link_generator import create_link_immobiliare, create_link_idealista
+from utils import check_if_shapely_polygon, plot_polygon, count_vertices, normalize_poi_types
+from rendering import render_area
+from instrumentation import metrics, stage, configure_from_env
+from isochrone_engine import LADDER_MINUTES, snap_to_ladder
+from pipeline import find_stations, search_stations, build_search_area, simplify_search_area, build_links
+from precompute import area_key, read_index
 
 st.set_page_config(
     page_title="Homie",
@@ -17,10 +20,25 @@ st.set_page_config(
 
 st.logo(f"assets/homie-icon.png", size="large")
 
+configure_from_env()
+
 with st.sidebar:
     st.title("Homie")
     st.text("Trova la tua casa ideale vicino ai mezzi pubblici")
 
+    backend_options_map = {
+        "ors": "OpenRouteService",
+        "local": "Locale (estratto OSM)",
+    }
+    backend = st.selectbox("Calcolo isocrone", options=list(backend_options_map.keys()), format_func=lambda val: backend_options_map[val])
+    snap_minutes = st.checkbox(
+        "Arrotonda il tempo agli scaglioni " + "/".join(map(str, LADDER_MINUTES)) + " min",
+        value=True,
+        help="Le isocrone di tutti gli scaglioni vengono calcolate insieme: cambiare tempo tra uno scaglione e l'altro non richiede nuove chiamate.",
+    )
+    show_debug = st.checkbox("Mostra dettagli di debug", value=False,
+                             help="Grafico dell'area, vertici dell'area non semplificata sulla mappa e metriche delle fasi di calcolo.")
+
 with st.container(border=True):
     st.markdown("### Area di ricerca")
 
@@ -33,7 +51,7 @@ with st.container(border=True):
         "tram": "Tram",
         "bus": "Bus",
     }
-    station_type = col1.pills("Tipo di stazione", options=list(station_options_map.keys()), format_func=lambda val: station_options_map[val], default="subway")
+    station_types = col1.pills("Tipo di stazione", options=list(station_options_map.keys()), format_func=lambda val: station_options_map[val], default=["subway"], selection_mode="multi")
         
     transport_options_map = {
         "foot-walking": "A piedi",
@@ -86,115 +104,132 @@ with st.container(border=True):
 
 submitted = st.button("Calcola area di ricerca", type="primary")
 
+# The search is kept in the session, so that changing a house filter only regenerates the links;
+# a failed search is dropped, so that the filters do not retry it
 if submitted:
+    if not station_types:
+        st.warning("Seleziona almeno un tipo di stazione.")
+        st.stop()
+    if snap_minutes and backend == "ors":
+        minutes = snap_to_ladder(minutes)
+    # Canonical order, so that Tram+Metro and Metro+Tram share the same cached area
+    st.session_state["search"] = (city_name, normalize_poi_types(station_types), transport_mode, minutes, backend)
+
+if "search" in st.session_state:
+    search = st.session_state["search"]
+    city_name, station_types, transport_mode, minutes, backend = search
+
     try:
-        poi_coords = overpass_query(city_name, station_type)
-        st.success(f"Trovate {len(poi_coords)} stazioni {station_options_map[station_type]} a {city_name}.")
+        poi_coords = find_stations(city_name, station_types)
+        counts = poi_coords["type"].value_counts()
+        st.success(f"Trovate {len(poi_coords)} stazioni a {city_name}: "
+                   + ", ".join(f"{station_options_map[t]} {counts[t]}" for t in station_types) + ".")
     except Exception as e:
         st.warning(f"Impossibile trovare stazioni del tipo selezionato, riprova. {e}")
-        poi_coords = []
-
-    city_boundary = load_city_boundary(city_name)
-    poi_coords = clean_poi_dataset(poi_coords, city_boundary)
-
-    poi_coords_straight = poi_coords[:20]
-
-    isochrones = calculate_isochrones(poi_coords_straight, transport_mode, minutes)
-    isochrones_dissolved = dissolve_isochrone(isochrones)
-    connected_isochrones = connect_polygons(isochrones_dissolved)
-
-    st.write("count vertices:", count_vertices(connected_isochrones))
-    plot_polygon(connected_isochrones)
-
-    # Simplify the connected_isochrones polygon
-    connected_isochrones_simple = connected_isochrones.simplify(tolerance=0.0008, preserve_topology=True)
-
-    st.write("count vertices (simplified):", count_vertices(connected_isochrones_simple))
-
-    # Create GeoDataFrame from simplified polygon
-    isochrones_gdf = gpd.GeoDataFrame(geometry=[connected_isochrones_simple])
-    
-    # Duplicate isochrones_gdf
-    isochrones_gdf_pdk = isochrones_gdf.copy()
-
-    # Extract coordinates for pydeck
-    isochrones_gdf_pdk["coordinates"] = isochrones_gdf["geometry"].apply(
-        lambda geom: [list(geom.exterior.coords)] if geom.geom_type == "Polygon" else []
-    )
-    # Remove non-serializable geometry column
-    isochrones_gdf_pdk = isochrones_gdf_pdk.drop(columns=["geometry"])
-
-    # Create isochrones layer
-    layer_iso = pdk.Layer(
-        "PolygonLayer",
-        data=isochrones_gdf_pdk,
-        get_polygon="coordinates",
-        get_fill_color=[0, 222, 77, 75],
-        pickable=False,
-        auto_highlight=False,
-    )
-    # Create stations layer
-    layer_stations = pdk.Layer(
-        "ScatterplotLayer",
-        data=pd.DataFrame(poi_coords_straight),  # <-- Fix: use list of dicts directly
-        get_position=["lon", "lat"],  # Correctly reference longitude and latitude
-        get_fill_color=[255, 0, 0, 100],
-        get_radius=150,  # Set radius for the scatterplot points
-        pickable=True,
-        auto_highlight=True,
-    )
+        del st.session_state["search"]
+        st.stop()
 
-    # Create highlighted vertices layer
-    layer_vertices = pdk.Layer(
-        "ScatterplotLayer",
-        data=pd.DataFrame(connected_isochrones.exterior.coords, columns=["lon", "lat"]),
-        get_position=["lon", "lat"],
-        get_fill_color=[255, 255, 0, 200],
-        get_radius=5,
-        pickable=True,
-        auto_highlight=True,
-    )
+    # Cover the whole city with as few isochrone requests as possible
+    poi_coords_straight = search_stations(*search)
+    if poi_coords_straight.empty:
+        st.warning("Nessuna stazione trovata all'interno della città.")
+        del st.session_state["search"]
+        st.stop()
 
     # Define initial view
     initial_view = pdk.ViewState(
-        latitude=poi_coords_straight[0]["lat"],
-        longitude=poi_coords_straight[0]["lon"],
+        latitude=poi_coords_straight["lat"].iloc[0],
+        longitude=poi_coords_straight["lon"].iloc[0],
         zoom=9,
     )
 
-    # Render the deck with a background basemap
-    deck = pdk.Deck(
-        layers=[layer_iso, layer_stations, layer_vertices],
-        tooltip={
-            "html": "Stazione: <b>{name}</b>",
-            "style": {"color": "white"},
-        },
-        initial_view_state=initial_view,
-        map_style="mapbox://styles/mapbox/dark-v11",  # Mapbox style with white background
-        #map_style="light",  
-    )
+    # Show the partial search area while the isochrones arrive
+    partial_map = st.empty()
+
+    def show_partial_area(geometry):
+        partial_map.pydeck_chart(render_area(geometry, view=initial_view).deck)
+
+    def show_isochrone_error(error):
+        st.warning(f"Impossibile calcolare le isocrone, riprova. {error}")
 
-    st.pydeck_chart(deck)
+    try:
+        with st.spinner("Calcolo isocrone..."):
+            connected_isochrones = build_search_area(*search, on_partial=show_partial_area, on_error=show_isochrone_error)
+    except Exception as e:
+        st.warning(f"Impossibile calcolare l'area di ricerca, riprova. {e}")
+        del st.session_state["search"]
+        st.stop()
+    partial_map.empty()
+    if connected_isochrones is None:
+        del st.session_state["search"]
+        st.stop()
+    if backend != "ors" or area_key(*search[:4]) not in read_index():
+        st.success(f"Calcolate isocrone attorno a {len(poi_coords_straight)} stazioni.")
+
+    st.write("count vertices:", count_vertices(connected_isochrones))
+    if show_debug:
+        st.pyplot(plot_polygon(connected_isochrones))
+
+    # Simplify the connected_isochrones polygon just enough for the portal links
+    simplified = simplify_search_area(*search)
+    connected_isochrones_simple = simplified.geometry
+
+    st.write("count vertices (simplified):", simplified.vertices,
+             f"(tolleranza {simplified.tolerance:.5f}, errore area {simplified.area_error:.2%})")
+
+    # Draw the full area, simplified only down to what is visible at the zoom of the map
+    with stage("render"):
+        rendered = render_area(
+            connected_isochrones,
+            stations=poi_coords_straight,
+            show_vertices=show_debug,
+            tooltip={
+                "html": "Stazione: <b>{name}</b>",
+                "style": {"color": "white"},
+            },
+            map_style="mapbox://styles/mapbox/dark-v11",  # Mapbox style with white background
+        )
+        st.pydeck_chart(rendered.deck)
+    metrics.set("render_payload_bytes", rendered.payload_bytes)
+    metrics.vertices("render", count_vertices(connected_isochrones), rendered.vertices)
+    st.caption(f"Mappa: {rendered.vertices} vertici, {rendered.payload_bytes / 1024:.0f} kB "
+               f"inviati al browser, preparata in {rendered.render_s * 1000:.0f} ms")
 
     #st.write("POIs Map")
     # Display POIs coordinates on a map
     #metro_df = pd.DataFrame(poi_coords, columns=["lat", "lon"])
     #st.map(metro_df)
 
-    link_immobiliare = create_link_immobiliare(isochrones_gdf, priceMax, priceMin, 
-                                areaMin, areaMax, roomsMin, roomsMax, 
-                                n_bagni, typology, fascia_piano, asta
-    )
-
-    link_idealista = create_link_idealista(connected_isochrones_simple, priceMax, priceMin, 
-                                areaMin, areaMax, roomsMin, roomsMax, 
-                                n_bagni 
-    )
+    link_immobiliare, link_idealista = build_links(connected_isochrones_simple, priceMin, priceMax,
+                                                   areaMin, areaMax, roomsMin, roomsMax,
+                                                   n_bagni, typology, fascia_piano, asta)
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.link_button("Apri ricerca Idealista.it", url=link_idealista, type="primary")
-        st.write(link_idealista)
+        if link_idealista:
+            st.link_button("Apri ricerca Idealista.it", url=link_idealista, type="primary")
+            st.write(link_idealista)
+        else:
+            st.warning("Impossibile creare il link di Idealista.it.")
     with col2:
-        st.link_button("Apri ricerca Immobiliare.it", url=link_immobiliare, type="primary")
-        st.write(link_immobiliare)
\ No newline at end of file
+        if link_immobiliare:
+            st.link_button("Apri ricerca Immobiliare.it", url=link_immobiliare, type="primary")
+            st.write(link_immobiliare)
+        else:
+            st.warning("Impossibile creare il link di Immobiliare.it.")
+
+if show_debug:
+    with st.sidebar.expander("Metriche", expanded=True):
+        st.markdown("**Tempi per fase** (totali dall'avvio del processo)")
+        st.dataframe(pd.DataFrame(metrics.stage_table()), hide_index=True)
+        st.markdown("**Cache**")
+        st.dataframe(pd.DataFrame(
+            [{"cache": cache, "hit rate": f"{rate:.0%}"} for cache, rate in sorted(metrics.hit_rates().items())]
+        ), hide_index=True)
+        st.markdown("**Richieste HTTP e vertici**")
+        snapshot = metrics.snapshot()
+        st.dataframe(pd.DataFrame(
+            [{"metrica": row["name"], **row["labels"], "valore": row["value"]}
+             for row in snapshot["counters"] + snapshot["gauges"] if row["name"] != "cache_lookups_total"]
+        ), hide_index=True)
+        st.download_button("Esporta (Prometheus)", metrics.prometheus_text(), file_name="metrics.txt")
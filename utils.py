@@ -1,183 +1,442 @@
-import requests
-import time
-import streamlit as st
-from shapely.geometry import shape, Polygon, MultiPolygon, LineString
+import logging
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape, Polygon, MultiPolygon
 from shapely.geometry import GeometryCollection
-import geopandas as gpd
-from shapely.ops import nearest_points, unary_union
-import matplotlib.pyplot as plt 
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+from http_client import CONNECT_TIMEOUT, Endpoint, get_client
+from instrumentation import metrics, stage
+from isochrone_engine import IsochroneEngine
+from isochrone_cache import IsochroneCache
+from boundaries import get_boundary, get_city_boundary
+
+
+logger = logging.getLogger(__name__)
+
+# Overpass instances tried in order, overridable with a comma-separated HOMIE_OVERPASS_URLS
+OVERPASS_URLS = tuple(os.environ.get("HOMIE_OVERPASS_URLS", ",".join((
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter",
+))).split(","))
+
+# The query asks the server for at most 25 s: a mirror that takes longer is left for the next one
+OVERPASS = Endpoint("overpass", OVERPASS_URLS, timeout=(CONNECT_TIMEOUT, 30), max_concurrency=2,
+                    max_retries=len(OVERPASS_URLS), backoff=2.0)
+
+
+# Tag filters of each POI type, in priority order: a node matching several types (e.g. a
+# platform served by trams and buses) is classified as the first one
+POI_FILTERS = {
+    "subway": (
+        {"railway": "station", "station": "subway"},
+    ),
+    "tram": (
+        {"railway": "tram_stop"},
+        {"station": "tram"},
+        {"public_transport": "platform", "tram": "yes"},
+    ),
+    "bus": (
+        {"highway": "bus_stop"},
+        {"public_transport": "platform", "bus": "yes"},
+        {"amenity": "bus_station"},
+    ),
+}
+POI_TYPES = tuple(POI_FILTERS)
+
+
+def normalize_poi_types(poi_types):
+    """
+    The POI types of a query as a tuple in priority order, e.g. ('subway', 'tram').
 
+    Args:
+        poi_types (str or iterable of str): A type, several types joined by '+' ('subway+tram')
+            or a list of types.
+    """
+    if isinstance(poi_types, str):
+        poi_types = poi_types.split("+")
+    poi_types = set(poi_types)
+    if not poi_types or not poi_types <= set(POI_TYPES):
+        raise ValueError("Unsupported POI type. Choose from 'subway', 'tram', 'bus'.")
+    return tuple(poi_type for poi_type in POI_TYPES if poi_type in poi_types)
+
+
+def overpass_request(city, poi_types):
+    """Overpass QL union query of the POIs of one or more types in the given city."""
+    statements = "\n      ".join(
+        "node" + "".join(f'["{key}"="{value}"]' for key, value in tags.items()) + "(area.searchArea);"
+        for poi_type in normalize_poi_types(poi_types)
+        for tags in POI_FILTERS[poi_type]
+    )
+    # `qt` skips sorting the result on the server, `center` gives a position to non-nodes
+    return f"""
+    [out:json][timeout:25];
+    area["name"="{city}"]->.searchArea;
+    (
+      {statements}
+    );
+    out center qt;
+    """
 
 
-def overpass_query(city, poi_type):
+def overpass_query(city, poi_types):
     """
-    Query OSM Overpass API to get coordinates of POIs in the given city.
+    Query OSM Overpass API to get coordinates of POIs in the given city, with a single
+    request for all the types.
 
     Args:
         city (str): Name of the city.
-        poi_type (str): One of 'subway', 'tram', or 'bus'.
+        poi_types (str or list of str): 'subway', 'tram', 'bus' or several of them
+            (see `normalize_poi_types`).
 
     Returns:
-        list of (lat, lon)
+        DataFrame: Columns 'lat', 'lon', 'name', 'id', 'type' and one per type (see `parse_overpass`).
     """
+    poi_types = normalize_poi_types(poi_types)
+    query = overpass_request(city, poi_types)
+    with stage("overpass", city=city, poi_type="+".join(poi_types)) as fields:
+        data = get_client().post(OVERPASS, data={"data": query})
+        fields["elements"] = len(data.get("elements", []))
+        return parse_overpass(data, poi_types)
 
-    type_filters = {
-        "subway": """
-            node["railway"="station"]["station"="subway"](area.searchArea);
-        """,
-        "tram": """
-            node["railway"="tram_stop"](area.searchArea);
-            node["station"="tram"](area.searchArea);
-            node["public_transport"="platform"]["tram"="yes"](area.searchArea);
-        """,
-        "bus": """
-            node["highway"="bus_stop"](area.searchArea);
-            node["public_transport"="platform"]["bus"="yes"](area.searchArea);
-            node["amenity"="bus_station"](area.searchArea);
-        """
-    }
 
-    if poi_type not in type_filters:
-        raise ValueError("Unsupported POI type. Choose from 'subway', 'tram', 'bus'.")
+async def overpass_query_async(city, poi_types):
+    """Same as `overpass_query`, without blocking the event loop while Overpass answers."""
+    poi_types = normalize_poi_types(poi_types)
+    data = await get_client().apost(OVERPASS, data={"data": overpass_request(city, poi_types)})
+    return parse_overpass(data, poi_types)
 
-    query = f"""
-    [out:json][timeout:25];
-    area["name"="{city}"]->.searchArea;
-    (
-      {type_filters[poi_type]}
-    );
-    out body;
+
+def parse_overpass(data, poi_types=POI_TYPES):
     """
+    Stations of an Overpass JSON answer, classified among `poi_types` by their tags.
 
-    url = "https://overpass-api.de/api/interpreter"
-    response = requests.post(url, data={"data": query})
-    response.raise_for_status()
-    data = response.json()
-
-    #st.write("Sample station name:", data["elements"][0]["tags"].get("name", "Unknown"))
-    #st.write("Sample station name:", data["elements"])
-
-    coords = [
-        {
-            "lat": element["lat"],
-            "lon": element["lon"],
-            "name": element["tags"].get("name", "Unknown")
-        }
-        for element in data.get("elements", [])
-        if "lat" in element and "lon" in element
-    ]
-    return coords
+    A stop can match several types (e.g. a platform with both tram=yes and bus=yes): it is one
+    row, with `type` the first of them in `POI_TYPES` order and True in the column of each one.
+
+    Returns:
+        DataFrame: Columns 'lat' and 'lon' (float), 'name' ('Unknown' when missing), 'id' (the
+        OSM id), 'type' (categorical over `POI_TYPES`) and one boolean column per type of
+        `poi_types`.
+    """
+    poi_types = normalize_poi_types(poi_types)
+    keys = {key for poi_type in poi_types for tags in POI_FILTERS[poi_type] for key in tags}
+    columns = {"lat": [], "lon": [], "name": [], "id": [], **{key: [] for key in keys}}
+    for element in data.get("elements", []):
+        position = element if "lat" in element else element.get("center")
+        if not position or "lat" not in position or "lon" not in position:
+            continue
+        tags = element.get("tags", {})
+        columns["lat"].append(position["lat"])
+        columns["lon"].append(position["lon"])
+        columns["name"].append(tags.get("name", "Unknown"))
+        columns["id"].append(element["id"])
+        for key in keys:
+            columns[key].append(tags.get(key))
+    table = pd.DataFrame(columns)
+
+    matches = {
+        poi_type: np.logical_or.reduce([
+            np.logical_and.reduce([(table[key] == value).to_numpy() for key, value in tags.items()])
+            for tags in POI_FILTERS[poi_type]
+        ])
+        for poi_type in poi_types
+    }
+    # Elements matching none of the filters (e.g. edited since the query) get the last type
+    matches[poi_types[-1]] = matches[poi_types[-1]] | ~np.logical_or.reduce(list(matches.values()))
+    types = np.select(list(matches.values()), poi_types, default=poi_types[-1]) if len(table) else []
+    return pd.DataFrame({
+        "lat": table["lat"].astype(float),
+        "lon": table["lon"].astype(float),
+        "name": table["name"].astype(str),
+        "id": table["id"].astype("int64"),
+        "type": pd.Categorical(types, categories=POI_TYPES),
+        **{poi_type: np.asarray(match, dtype=bool) for poi_type, match in matches.items()},
+    })
 
 def load_city_boundary(city_name):
-    file_path = f"data/{city_name}_boundary.geojson"
     try:
-        with open(file_path, "r") as file:
-            boundary = gpd.read_file(file)
-        return boundary.geometry.unary_union.__geo_interface__
+        return get_city_boundary(city_name).geometry.__geo_interface__
     except FileNotFoundError:
-        raise FileNotFoundError(f"Boundary file for {city_name} not found at {file_path}.")
+        raise
     except Exception as e:
         raise RuntimeError(f"Error loading city boundary: {e}")
 
 def load_geojson(filename):
-    file_path = f"data/{filename}.geojson"
     try:
-        with open(file_path, "r") as file:
-            boundary = gpd.read_file(file)
-        return boundary.geometry.unary_union.__geo_interface__
+        return get_boundary(filename).geometry.__geo_interface__
     except FileNotFoundError:
-        raise FileNotFoundError(f"Boundary file for {city_name} not found at {file_path}.")
+        raise
     except Exception as e:
         raise RuntimeError(f"Error loading city boundary: {e}")  
 
+def get_prepared_boundary(city_name):
+    """
+    Return the boundary of a city as a prepared shapely geometry, loaded once per process.
+    """
+    return get_city_boundary(city_name).geometry
+
 def clean_poi_dataset(poi_coords, boundary):
     """
     Filter POI coordinates to ensure they are within the city boundary.
 
     Args:
-        poi_coords (list of dict): List of POI coordinates with keys 'lat', 'lon', and 'name'.
-        boundary (Polygon or MultiPolygon): City boundary as a shapely geometry.
+        poi_coords (list of dict or DataFrame): POI coordinates with keys 'lat', 'lon', 'name'
+            and optionally 'id' and 'type'.
+        boundary (Polygon, MultiPolygon or GeoJSON dict): City boundary. Shapely geometries are
+            prepared in place, so passing the same object again (see `get_prepared_boundary`)
+            skips the preparation.
 
     Returns:
-        list of dict: Filtered POI coordinates within the city boundary.
+        DataFrame: POIs within the city boundary, with columns 'lat', 'lon', 'name' and 'id'
+            and 'type' if given.
     """
-    boundary_shape = shape(boundary)
-    filtered_coords = [
-        {
-            "lat": poi["lat"],
-            "lon": poi["lon"],
-            "name": poi["name"]
-        }
-        for poi in poi_coords
-        if boundary_shape.contains(shape({"type": "Point", "coordinates": (poi["lon"], poi["lat"])}))
-    ]
-    return filtered_coords
+    if isinstance(boundary, dict):
+        boundary = shape(boundary)
+    shapely.prepare(boundary)
+
+    with stage("clean_poi_dataset") as fields:
+        pois = pd.DataFrame(poi_coords)
+        pois = pois.reindex(columns=["lat", "lon", "name", *(column for column in ("id", "type") if column in pois)])
+        inside = shapely.contains_xy(boundary, pois["lon"].to_numpy(), pois["lat"].to_numpy())
+        fields.update(pois=len(pois), inside=int(inside.sum()))
+        return pois[inside].reset_index(drop=True)
+
+_isochrone_engine = None
+
+def get_isochrone_engine():
+    """Return the process-wide isochrone engine, sharing its connection pool, rate limiter and disk cache."""
+    global _isochrone_engine
+    if _isochrone_engine is None:
+        _isochrone_engine = IsochroneEngine(cache=IsochroneCache(), client=get_client())
+    return _isochrone_engine
 
 # Calculate walking isochrones for the POIs using OpenRouteService API
-def calculate_isochrones(poi_coords, mode, time_minutes):
+def calculate_isochrones(poi_coords, mode, time_minutes, on_batch=None, ladder=None, on_error=None):
     """
     Calculate walking isochrones for a list of POIs using OpenRouteService API.
     Returns the geometry of the isochrones in GeoJSON format.
+
+    `on_batch`, if given, is called with the list of isochrones of every request as soon as it
+    completes (cache hits first), e.g. `IncrementalDissolver.add` to dissolve them on the fly.
+    `ladder`, if given, lists other travel times fetched in the same requests and cached for
+    later searches (see `IsochroneEngine.fetch`). If the requests fail the error is logged,
+    passed to `on_error` if given, and an empty list is returned.
     """
     try:
-        # OpenRouteService API endpoint
-        ors_url = "https://api.openrouteservice.org/v2/isochrones/" + mode # modes: cycling-regular, cycling-electric, driving-car, foot-walking
-        #api_key = "5b3ce3597851110001cf6248a0daf93b2ba54f95b8bb3266ed6fcae6"
-        api_key = "5b3ce3597851110001cf62480c0a8084fb284f72a913a0269907ada3"
-
         isochrones = []
-        
-        with st.spinner("Calcolo isocrone..."):
-               
-            for poi in poi_coords:
-                payload = {
-                    "locations": [[poi["lon"], poi["lat"]]],
-                    "range": [time_minutes * 60],  # Convert minutes to seconds
-                    "range_type": "time",
-                    "attributes": ["area"]
-                }
-                headers = {
-                    "Authorization": api_key,
-                    "Content-Type": "application/json"
-                }
-                response = requests.post(ors_url, json=payload, headers=headers)
-                response.raise_for_status()
-                
-                data = response.json()
-                for feature in data.get("features", []):
-                    geometry = feature.get("geometry")
-                    if geometry:
-                        isochrones.append(geometry)
-                time.sleep(3)
-        st.success(f"Calcolate isocrone attorno a {len(poi_coords)} stazioni.")
-
+        with stage("isochrones", mode=mode, minutes=time_minutes) as fields:
+            # modes: cycling-regular, cycling-electric, driving-car, foot-walking
+            for batch in get_isochrone_engine().iter_fetch(poi_coords, mode, time_minutes, ladder):
+                isochrones.extend(batch)
+                if on_batch is not None:
+                    on_batch(batch)
+            fields["isochrones"] = len(isochrones)
+        logger.info("Calcolate isocrone attorno a %d stazioni.", len(poi_coords))
         return isochrones
 
     except Exception as e:
-        st.warning(f"Impossibile calcolare le isocrone, riprova. {e}")
+        logger.warning("Impossibile calcolare le isocrone: %s", e)
+        if on_error is not None:
+            on_error(e)
+        return []
+
+
+class IncrementalDissolver:
+    """
+    Running union of isochrones that arrive over time.
+
+    Incoming geometries are assigned to square tiles by the center of their bounding box and
+    each tile keeps its own dissolved geometry, updated `chunk_size` geometries at a time. The
+    cost of an update is bounded by the size of a tile rather than by everything received so
+    far, and the final union only has to stitch mostly disjoint tiles together.
+
+    Parameters:
+    - tile_size: side of a tile in degrees
+    - chunk_size: number of geometries buffered in a tile before merging them into it
+    """
+
+    def __init__(self, tile_size=0.02, chunk_size=16):
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+        self.count = 0
+        self._tiles = {}
+        self._pending = {}
+        self._geometry = None
+
+    def add(self, geometries):
+        """Add an iterable of GeoJSON dicts or shapely geometries."""
+        with stage("dissolve"):
+            self._add(geometries)
+
+    def _add(self, geometries):
+        for geometry in geometries:
+            if not isinstance(geometry, BaseGeometry):
+                geometry = shape(geometry)
+            minx, miny, maxx, maxy = geometry.bounds
+            tile = (math.floor((minx + maxx) / 2 / self.tile_size), math.floor((miny + maxy) / 2 / self.tile_size))
+            pending = self._pending.setdefault(tile, [])
+            pending.append(geometry)
+            self.count += 1
+            if len(pending) >= self.chunk_size:
+                self._merge(tile)
+        self._geometry = None
+
+    def _merge(self, tile):
+        parts = self._pending.pop(tile)
+        if tile in self._tiles:
+            parts.append(self._tiles[tile])
+        self._tiles[tile] = shapely.union_all(parts)
+
+    @property
+    def geometry(self):
+        """The union of everything added so far (None if nothing was added)."""
+        if self._geometry is None:
+            with stage("dissolve"):
+                for tile in list(self._pending):
+                    self._merge(tile)
+                if self._tiles:
+                    self._geometry = shapely.union_all(list(self._tiles.values()))
+        return self._geometry
+
+    def polygons(self):
+        """The dissolved geometry as a list of disjoint Polygons."""
+        geometry = self.geometry
+        if isinstance(geometry, Polygon):
+            return [geometry]
+        elif isinstance(geometry, (MultiPolygon, GeometryCollection)):
+            return [geom for geom in geometry.geoms if isinstance(geom, Polygon)]
         return []
-    
+
+
 # Dissolve all isochrones into a single geometry
 def dissolve_isochrone(iso_polygon):
-    iso_polygon_diss = gpd.GeoSeries([shape(geometry) for geometry in iso_polygon]).unary_union
-    # Handle both Polygon and MultiPolygon
-    if isinstance(iso_polygon_diss, Polygon):
-        isochrones_shapes  = [iso_polygon_diss]
-    elif isinstance(iso_polygon_diss, MultiPolygon):
-        isochrones_shapes  = list(iso_polygon_diss.geoms)
+    dissolver = IncrementalDissolver()
+    dissolver.add(iso_polygon)
+    return dissolver.polygons()
+
 
-    return isochrones_shapes
+def minimum_spanning_edges(polygons):
+    """
+    Compute the minimum spanning tree of a list of geometries, weighted by their exact distance.
+
+    Kruskal's algorithm first runs on the pairs closer than a typical nearest-neighbour
+    distance, which yields every tree edge up to that length. Candidate pairs come from an
+    STRtree query on the envelopes grown by the search radius, and exact distances are then
+    computed only for the pairs that can still join two components.
+    The remaining components are then joined in Borůvka rounds: each component but the
+    largest looks for its closest geometry outside itself, with a radius that doubles per
+    component until something is found, and by the cut property that edge belongs to the
+    tree. Growing the radius per component keeps a few far-away polygons from turning the
+    query into all pairs.
 
+    Parameters:
+    - polygons: list or array of shapely geometries
 
-def connect_polygons(polygons, bridge_width=1e-6):
+    Returns:
+    - tuple of two int arrays (i, j) with the n - 1 edges of the tree
+    """
+    geoms = np.asarray(polygons, dtype=object)
+    n = len(geoms)
+    tree = shapely.STRtree(geoms)
+    # Nearest-neighbour distances between envelopes, only used to pick the first radius.
+    # Envelopes equal to all the others have no exclusive nearest neighbour: start them at 0
+    envelopes = shapely.envelope(geoms)
+    (source, _), distances = shapely.STRtree(envelopes).query_nearest(envelopes, exclusive=True, return_distance=True)
+    nearest = np.full(n, np.inf)
+    np.minimum.at(nearest, source, distances)
+    nearest[np.isinf(nearest)] = 0.0
+    minx, miny, maxx, maxy = shapely.total_bounds(geoms)
+    step = np.hypot(maxx - minx, maxy - miny) / n or 1.0
+    bounds = shapely.bounds(geoms)
+
+    def candidates(members, radius):
+        """Pairs (member, other) whose envelopes are closer than `radius`: a superset of `dwithin`."""
+        radius = np.broadcast_to(radius, len(members))[:, None]
+        k, j = tree.query(shapely.box(*(bounds[members] + np.hstack([-radius, -radius, radius, radius])).T))
+        return members[k], j
+
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    tree_i, tree_j = [], []
+
+    def add(edges):
+        for _, i, j in sorted(edges):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[root_j] = root_i
+                tree_i.append(i)
+                tree_j.append(j)
+
+    # Every pair within `start`: Kruskal on them gives all the tree edges up to that length.
+    # A quantile of the nearest-neighbour distances, so that outliers do not set it
+    start = np.quantile(nearest, 0.9)
+    i, j = candidates(np.arange(n), start)
+    keep = i < j
+    i, j = i[keep], j[keep]
+    d = shapely.distance(geoms[i], geoms[j])
+    within = d <= start
+    add(zip(d[within], i[within], j[within]))
+
+    # First search radius of the component of each geometry: no pair within `start` joins two
+    # components any more, and a merged component leaves at least as far as the closest edge
+    # found by its parts
+    bound = np.full(n, start * 2 if start > 0 else step)
+    while len(tree_i) < n - 1:
+        _, labels, sizes = np.unique([find(x) for x in range(n)], return_inverse=True, return_counts=True)
+        order = np.argsort(labels, kind="stable")
+        groups = np.split(order, np.cumsum(sizes)[:-1])
+        pending = np.array([c for c in range(len(groups)) if c != sizes.argmax()], dtype=np.intp)
+        radius = np.array([bound[group].min() for group in groups])
+        radius[radius == 0] = step
+
+        edges = []
+        while len(pending):
+            members = np.concatenate([groups[c] for c in pending])
+            i, j = candidates(members, radius[labels[members]])
+            outside = labels[i] != labels[j]
+            i, j = i[outside], j[outside]
+            d = shapely.distance(geoms[i], geoms[j])
+            # Beyond the radius a closer pair may have been missed
+            within = d <= radius[labels[i]]
+            i, j, d = i[within], j[within], d[within]
+            # Closest outside pair of every component that found one
+            best = np.lexsort((d, labels[i]))
+            found, first = np.unique(labels[i][best], return_index=True)
+            edges.extend(zip(d[best[first]], i[best[first]], j[best[first]]))
+            for c, distance in zip(found.tolist(), d[best[first]].tolist()):
+                bound[groups[c]] = distance
+            pending = pending[~np.isin(pending, found)]
+            radius[pending] *= 2
+
+        add(edges)
+    return np.array(tree_i, dtype=np.intp), np.array(tree_j, dtype=np.intp)
+
+
+def connect_polygons(polygons, bridge_width=1e-6, disjoint=False):
     """
     Connect a list of shapely Polygon geometries by creating bridges between them so that all polygons
     are linked into a single continuous shape. Bridges are created along the minimum spanning tree (MST)
-    based on the pairwise distances between polygons.
+    based on the pairwise distances between polygons (see `minimum_spanning_edges`).
 
     Parameters:
     - polygons: list of shapely Polygon geometries
     - bridge_width: float, width for buffer around connecting lines
+    - disjoint: bool, True if the polygons are known not to overlap (e.g. the output of
+      `dissolve_isochrone`), so that only the bridges are overlaid on them instead of
+      running a full union again
 
     Returns:
     - A single shapely Polygon or MultiPolygon representing the unified connected shape.
@@ -185,33 +444,22 @@ def connect_polygons(polygons, bridge_width=1e-6):
     if not polygons:
         return None
     if len(polygons) == 1:
+        vertices = int(shapely.get_num_coordinates(polygons[0]))
+        metrics.vertices("connect_polygons", vertices, vertices)
         return polygons[0]
 
-    n = len(polygons)
-    bridges = []
-    # Build a Minimum Spanning Tree (MST) using Prim's algorithm
-    connected = {0}
-    available = set(range(1, n))
-    
-    while available:
-        min_edge = None
-        min_dist = float('inf')
-        for i in connected:
-            for j in available:
-                # Calculate the distance between the two polygons
-                dist = polygons[i].distance(polygons[j])
-                if dist < min_dist:
-                    min_dist = dist
-                    min_edge = (i, j)
-        # Create a bridge between the closest points of the two polygons in the chosen edge
-        i, j = min_edge
-        p1, p2 = nearest_points(polygons[i], polygons[j])
-        bridge = LineString([p1, p2]).buffer(bridge_width)
-        bridges.append(bridge)
-        connected.add(j)
-        available.remove(j)
-    
-    unified = unary_union(polygons + bridges)
+    with stage("connect_polygons", polygons=len(polygons)):
+        geoms = np.asarray(polygons, dtype=object)
+        i, j = minimum_spanning_edges(geoms)
+        # Bridge the closest points of the two polygons of every MST edge, all at once
+        bridges = shapely.buffer(shapely.shortest_line(geoms[i], geoms[j]), bridge_width, cap_style="square")
+
+        if disjoint:
+            unified = shapely.union(MultiPolygon(list(polygons)), shapely.union_all(bridges))
+        else:
+            unified = unary_union(list(polygons) + list(bridges))
+    metrics.vertices("connect_polygons", int(shapely.get_num_coordinates(geoms).sum()),
+                     int(shapely.get_num_coordinates(unified)))
     return unified
 
 def check_if_shapely_polygon(geometry):
@@ -219,7 +467,10 @@ def check_if_shapely_polygon(geometry):
 
 def plot_polygon(geom, figsize=(8, 6), edgecolor='black', facecolor='blue', alpha=0.5):
     """
-    Streamlit helper to plot a single shapely Polygon or MultiPolygon.
+    Plot a single shapely Polygon or MultiPolygon, e.g. for `st.pyplot`.
+
+    geopandas and matplotlib are only imported here, and the figure is not registered with
+    pyplot, so it is freed as soon as the caller drops it.
 
     Parameters:
     - geom: shapely geometry (Polygon or MultiPolygon)
@@ -227,14 +478,21 @@ def plot_polygon(geom, figsize=(8, 6), edgecolor='black', facecolor='blue', alph
     - edgecolor: border color
     - facecolor: fill color
     - alpha: transparency
+
+    Returns:
+    - matplotlib Figure
     """
+    import geopandas as gpd
+    from matplotlib.figure import Figure
+
     # Wrap geometry in GeoDataFrame
     gdf = gpd.GeoDataFrame(geometry=[geom], crs="EPSG:4326")
     # Create matplotlib figure
-    fig, ax = plt.subplots(figsize=figsize)
+    fig = Figure(figsize=figsize)
+    ax = fig.subplots()
     gdf.plot(ax=ax, edgecolor=edgecolor, facecolor=facecolor, alpha=alpha)
     ax.set_axis_off()
-    st.pyplot(fig)
+    return fig
 
 def count_vertices(geom):
     """